@@ -1,26 +1,50 @@
 # Used to generate the spell data included with the parser
 
+import argparse
+import contextlib
+import hashlib
+import io
+import locale
+import pickle
 import re
 import os.path
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import sparules
+from sparules import SpaRules, SpaRulesFile
+from spellgraph import SpellGraph
 
 DBSpellsFile = 'spells_us.txt'
 DBSpellsStrFile = 'spells_us_str.txt'
+OutputFile = 'output.txt'
+CacheFile = 'createdata.cache'
 
 ADPS_CASTER_VALUE = 1
 ADPS_MELEE_VALUE = 2
 ADPS_TANK_VALUE = 4
 ADPS_HEALER_VALUE = 8
 ADPS_ALL_VALUE = ADPS_CASTER_VALUE + ADPS_MELEE_VALUE + ADPS_TANK_VALUE + ADPS_HEALER_VALUE
-ADPS_CASTER = [ 8, 9, 15, 97, 118, 124, 127, 132, 170, 212, 273, 286, 294, 302, 303, 339, 351, 358, 375, 383, 399, 413, 461, 462, 501, 507 ]
-ADPS_MELEE = [ 2, 4, 5, 11, 118, 119, 169, 171, 176, 177, 182, 184, 185, 186, 189, 190, 198, 200, 201, 211, 216, 220, 225, 227, 250, 252, 258, 266, 276, 279, 280, 301, 330, 339, 351, 364, 383, 418, 427, 429, 433, 459, 471, 473, 482, 496, 498, 499, 503 ]
-ADPS_TANK = [ 1, 6, 7, 55, 114, 120, 125, 147, 161, 162, 163, 168, 172, 173, 174, 175, 178, 181, 188, 197, 213, 214, 214, 259, 320, 323, 393, 405, 450, 451, 452, 505, 515, 516 ]
-ADPS_HEALER = [ 9, 15, 44, 97, 120, 125, 127, 132, 274, 392, 394, 395, 396, 399, 400, 501 ]
+
+# SPA lists, base1 limits and focus bonuses from sparules.txt
+SPA_RULES = SpaRules.load(SpaRulesFile, { 'Caster': ADPS_CASTER_VALUE, 'Melee': ADPS_MELEE_VALUE, 'Tank': ADPS_TANK_VALUE,
+                                          'Healer': ADPS_HEALER_VALUE })
+ADPS_CASTER = SPA_RULES.rules['Caster']
+ADPS_MELEE = SPA_RULES.rules['Melee']
+ADPS_TANK = SPA_RULES.rules['Tank']
+ADPS_HEALER = SPA_RULES.rules['Healer']
 ADPS_LIST = ADPS_CASTER + ADPS_MELEE + ADPS_TANK + ADPS_HEALER
-ADPS_B1_MIN = { 4: 1, 5: 1, 6: 1, 7: 1, 8: 1, 9: 1, 11: 100 }
-ADPS_B1_MAX = { 182: 0, 197: 0 }
-ADPS_BEN_DET = [ 399 ]
+ADPS_B1_MIN = SPA_RULES.rules['Base1Min']
+ADPS_B1_MAX = SPA_RULES.rules['Base1Max']
+ADPS_BEN_DET = SPA_RULES.rules['BeneficialDetrimental']
+ADPS_EXT_DUR = SPA_RULES.rules['ExtendedDuration']
+MAX_HITS = SPA_RULES.rules['MaxHits']
+
 IGNORE = [ 'Test Shield', 'SKU', 'SummonTest', ' Test', 'test atk', 'PvPS', 'BetaTestSpell', 'AA_SPELL_PH', 'test speed', ' test', 'Beta ', 'GM ', 'BetaAcrylia', 'NA ', 'MRC -', '- RESERVED', 'N/A', 'SKU27', 'Placeholder', 'Type3', 'Type 3', 'AVCReserved', ' ID Focus ', 'Use Ability', 'Beta Fish' ]
 IS_TARGETRING = [ 'Issuance' ]
+LINK_TYPES = [ 'recourse', 'spa339', 'spa340', 'spa373', 'spa374', 'spa406' ]
+OUTPUT_FIELDS = [ 'id', 'name', 'level', 'maxDuration', 'beneficial', 'maxHits', 'spellTarget', 'classMask', 'damaging', 'combatSkill', 'resist', 'songWindow', 'adps', 'mgb', 'rank', 'landsOnYouAmbiguity', 'landsOnOtherAmbiguity', 'landsOnYou', 'landsOnOther', 'wearOff' ]
 
 ROMAN_REGEX = re.compile(r"""
     ^M{0,3}              # thousands
@@ -29,69 +53,25 @@ ROMAN_REGEX = re.compile(r"""
     (IX|IV|V?I{0,3})$    # ones
 """, re.VERBOSE | re.IGNORECASE)
 
-RANK_WORDS = {"Azia", "Beza", "Caza", "Third", "Fifth", "Octave"}
-
-ADPS_EXT_DUR = dict()
-DBSTRINGS = dict()
-UNIQUE_YOU = dict()
-UNIQUE_OTHER = dict()
-MAX_HITS = dict()
-
-# bard SoR
-ADPS_EXT_DUR[4516] = 1       # Improved Deftdance Disc
-ADPS_EXT_DUR[8030] = 2       # Improved Thousand Blades Disc
-# beast SoR
-ADPS_EXT_DUR[4671] = 1       # Improved Protective Spirit Disc
-# berserker SoR
-ADPS_EXT_DUR[100160210] = 90 # Extended Havoc 
-ADPS_EXT_DUR[100160170] = 5  # Improved Berserking Disc
-ADPS_EXT_DUR[100160110] = 2  # Improved Cleaving Acrimony Disc
-#ranger SoR
-ADPS_EXT_DUR[100040210] = 20 # Improved Trueshot Disc
-# rogue SoR
-ADPS_EXT_DUR[100090250] = 8  # Extended Aspbleeder Disc
-ADPS_EXT_DUR[100090240] = 15 # Improved Fatal Aim Disc
-ADPS_EXT_DUR[6197] = 2       # Improved Frenzied Stabbing Disc
-ADPS_EXT_DUR[100090260] = 90 # Improved Thief's Eyes
-ADPS_EXT_DUR[4695] = 5       # Improved Twisted Chance Disc
-# monk SoR
-ADPS_EXT_DUR[100070090] = 3  # Improved Crystalpalm Discipline 
-ADPS_EXT_DUR[100070160] = 3  # Improved Heel of Kanji Disc
-ADPS_EXT_DUR[100070340] = 5  # Extended Impenetrable Disc
-ADPS_EXT_DUR[100070200] = 5  # Extended Impenetrable Disc
-ADPS_EXT_DUR[100070140] = 2  # Improved Scaledfist Disc
-ADPS_EXT_DUR[4691] = 3       # Improved Speed Focus Disc
-# sk/paladin SoR
-ADPS_EXT_DUR[100030230] = 5   # Enduring Reproval
-ADPS_EXT_DUR[100050180] = 20  # Extended Decrepit Skin
-ADPS_EXT_DUR[100030240] = 25  # Extended Steely Stance
-ADPS_EXT_DUR[100030180] = 18  # Extended Preservation of Marr
-# war SoR
-ADPS_EXT_DUR[100010190] = 108 # Extended Bracing Defense
-ADPS_EXT_DUR[8000] = 90       # Extended Commanding Voice
-ADPS_EXT_DUR[100010180] = 114 # Extended Field Armorer
-ADPS_EXT_DUR[100010120] = 1   # Extended Shield Reflect
-
-# sk/paladin SoR
-MAX_HITS[100030230] = 9       # Enduring Reproval
-MAX_HITS[100050180] = 80      # Extended Decrepit Skin
-MAX_HITS[100030180] = 70      # Extended Preservation of Marr
+RANK_WORDS = {"azia", "beza", "caza", "third", "fifth", "octave"}
 
 def is_roman(word):
     return bool(ROMAN_REGEX.match(word))
 
+# same rules as EQDataStore.AbbreviateSpellName
 def abbreviate(name):
     parts = name.split()
+    count = len(parts)
 
     # Handle "Rk. II"
-    if len(parts) >= 3 and parts[-2].lower() == "Rk." and is_roman(parts[-1]):
+    if len(parts) >= 3 and parts[-2].lower() == "rk." and is_roman(parts[-1]):
         parts = parts[:-2]
 
     # strip other trailing rank indicators
     while parts:
         last = parts[-1]
 
-        if last in RANK_WORDS:
+        if last.lower() in RANK_WORDS:
             parts.pop()
             continue
         if is_roman(last):
@@ -101,25 +81,11 @@ def abbreviate(name):
             parts.pop()
             continue
         break
-    return " ".join(parts)
 
-def getAdpsValueFromSpa(current, spa, requireDet):
-  if current == ADPS_ALL_VALUE:
-    return current
-  updated = 0
-  if spa in ADPS_CASTER:
-    if spa not in ADPS_BEN_DET or (requireDet == None or requireDet == True):
-      updated = ADPS_CASTER_VALUE
-  if spa in ADPS_MELEE:
-    updated = updated + ADPS_MELEE_VALUE
-  if spa in ADPS_TANK:
-    updated = updated + ADPS_TANK_VALUE
-  if spa in ADPS_HEALER:
-    if spa not in ADPS_BEN_DET or (requireDet == None or requireDet == False):
-      updated = updated + ADPS_HEALER_VALUE
-  if current > 0:
-    updated = updated | current 
-  return updated
+    # nothing removed so keep the original
+    if len(parts) == count:
+        return name
+    return " ".join(parts)
 
 def getAdpsValueFromSkill(current, skill, endurance):
   if current == ADPS_ALL_VALUE:
@@ -147,274 +113,613 @@ def intToRoman(number):
 def isSingleClass(n: int):
   return n > 0 and n <= 32768 and (n & (n - 1)) == 0
 
+
+def isIgnored(name):
+  if len(name) <= 3:
+    return True
+  for ig in IGNORE:
+    if ig in name:
+      return True
+  return False
+
 # DB strings for lands on messages
-if os.path.isfile(DBSpellsStrFile):
-  print('Loading Spell Strings from %s' % DBSpellsStrFile)
-  db = open(DBSpellsStrFile, 'r')
-  for line in db:
-    data = line.split('^')
+def loadStrings(fileName):
+  dbStrings = dict()
+  uniqueYou = dict()
+  uniqueOther = dict()
+
+  if os.path.isfile(fileName):
+    print('Loading Spell Strings from %s' % fileName)
+    db = open(fileName, 'r')
+    for line in db:
+      data = line.split('^')
+
+      try:
+        id = data[0]
+        landOnYou = data[3]
+        landOnOther = data[4]
+        wearOff = data[5]
+        dbStrings[id] = { 'landsOnYou': landOnYou, 'landsOnOther': landOnOther, 'wearOff': wearOff }
+
+        if landOnYou:
+          if landOnYou not in uniqueYou:
+            uniqueYou[landOnYou] = True
+          else:
+            uniqueYou[landOnYou] = False
 
+        if landOnOther:
+          if landOnOther not in uniqueOther:
+            uniqueOther[landOnOther] = True
+          else:
+            uniqueOther[landOnOther] = False
+      except ValueError:
+        pass
+
+  return dbStrings, uniqueYou, uniqueOther
+
+# lands on messages seen once or more. only the hash of each message is kept
+class MessageCounts:
+  def __init__(self):
+    self.seen = set()
+    self.repeated = set()
+
+  def add(self, message):
+    key = hash(message)
+    if key in self.seen:
+      self.repeated.add(key)
+    else:
+      self.seen.add(key)
+
+  def __contains__(self, message):
+    return hash(message) in self.seen
+
+  # True when the message is unique, same as the values of uniqueYou/uniqueOther
+  def __getitem__(self, message):
+    key = hash(message)
+    if key not in self.seen:
+      raise KeyError(message)
+    return key not in self.repeated
+
+def getStrings(data):
+  return { 'landsOnYou': sys.intern(data[3]), 'landsOnOther': sys.intern(data[4]), 'wearOff': sys.intern(data[5]) }
+
+# DB strings read alongside the spells. both files are sorted by id so each lookup only moves forward
+# through spells_us_str.txt and only the current line is kept. rows of either file that are out of
+# order are still found: late rows of the string file are kept in a dict and so are the strings of
+# spells that come after a higher id in spells_us.txt, as they are read on the way forward
+class StringStream:
+  def __init__(self, fileName, late, behind):
+    self.late = late
+    self.behind = behind
+    self.kept = dict()
+    self.lines = open(fileName, 'r') if os.path.isfile(fileName) else None
+    self.maxId = -1
+    self.lastId = None
+    self.current = None
+    self.next = self.readNext()
+
+  def readNext(self):
+    if self.lines is None:
+      return None
+    for line in self.lines:
+      data = line.split('^')
+      if len(data) > 5 and data[0].isdigit():
+        intId = int(data[0])
+        # rows behind the highest id so far are in late
+        if intId >= self.maxId:
+          self.maxId = intId
+          strings = getStrings(data)
+          if intId in self.behind:
+            self.kept[intId] = strings
+          return intId, strings
+    self.close()
+    return None
+
+  def close(self):
+    if self.lines is not None:
+      self.lines.close()
+      self.lines = None
+
+  def find(self, id):
+    intId = int(id)
+    if intId in self.late:
+      return self.late[intId]
+    if self.lastId is not None and intId < self.lastId:
+      return self.kept.get(intId)
+    self.lastId = intId
+
+    # the last row wins when an id is repeated, same as loadStrings
+    while self.next is not None and self.next[0] <= intId:
+      self.current = self.next
+      self.next = self.readNext()
+    return self.current[1] if self.current and self.current[0] == intId else None
+
+  def __contains__(self, id):
+    return self.find(id) is not None
+
+  def __getitem__(self, id):
+    strings = self.find(id)
+    if strings is None:
+      raise KeyError(id)
+    return strings
+
+# ids of spellsFile that come after a higher id
+def getIdsBehind(spellsFile):
+  behind = set()
+  if os.path.isfile(spellsFile):
+    maxId = -1
+    with open(spellsFile, 'r') as spells:
+      for line in spells:
+        id = line.split('^', 1)[0]
+        if id.isdigit():
+          intId = int(id)
+          if intId < maxId:
+            behind.add(intId)
+          maxId = max(maxId, intId)
+  return behind
+
+# same as loadStrings but the strings are joined with the spells as they are merged and the
+# uniqueness of the messages is counted over their hashes
+def streamStrings(fileName, spellsFile=DBSpellsFile):
+  uniqueYou = MessageCounts()
+  uniqueOther = MessageCounts()
+  late = dict()
+
+  if os.path.isfile(fileName):
+    print('Counting Spell Strings in %s' % fileName)
+    maxId = -1
+    with open(fileName, 'r') as db:
+      for line in db:
+        data = line.split('^')
+        if len(data) > 5:
+          if data[3]:
+            uniqueYou.add(data[3])
+          if data[4]:
+            uniqueOther.add(data[4])
+          if data[0].isdigit():
+            intId = int(data[0])
+            if intId < maxId:
+              late[intId] = getStrings(data)
+            maxId = max(maxId, intId)
+
+  return StringStream(fileName, late, getIdsBehind(spellsFile)), uniqueYou, uniqueOther
+
+def toInt(value):
+  try:
+    return int(float(value))
+  except ValueError:
+    return 0
+
+# every effect slot of every spell decoded once into flat arrays. row r is slot slot[r] of the spell
+# at index spell[r] and the rows of one spell are contiguous and in file order
+class SlotTable:
+  def __init__(self):
+    self.ids = []
+    self.starts = array('I', [0])
+    self.spell = array('I')
+    self.slot = array('i')
+    self.spa = array('i')
+    self.base1 = array('q')
+    self.base2 = array('q')
+    # the raw text is kept for the proc links which are keyed by it
+    self.base1Text = []
+    self.base2Text = []
+    self.bySpa = dict()
+
+  def __len__(self):
+    return len(self.spa)
+
+  def addSpell(self, id, slotData):
+    index = len(self.ids)
+    self.ids.append(id)
+
+    for slot in slotData.split('$'):
+      values = slot.split('|')
+      if len(values) > 1:
+        spa = int(values[1])
+        self.bySpa.setdefault(spa, array('I')).append(len(self.spa))
+        self.spell.append(index)
+        self.slot.append(int(values[0]) if values[0].isdigit() else 0)
+        self.spa.append(spa)
+        self.base1.append(toInt(values[2]))
+        self.base2.append(toInt(values[3]))
+        self.base1Text.append(sys.intern(values[2]))
+        self.base2Text.append(sys.intern(values[3]))
+
+    self.starts.append(len(self.spa))
+    return index
+
+  def extend(self, other):
+    offset = len(self.ids)
+    rowOffset = len(self.spa)
+    self.ids.extend(other.ids)
+    self.starts.extend(start + rowOffset for start in other.starts[1:])
+    self.spell.extend(index + offset for index in other.spell)
+    for spa, rows in other.bySpa.items():
+      self.bySpa.setdefault(spa, array('I')).extend(row + rowOffset for row in rows)
+    for name in ('slot', 'spa', 'base1', 'base2', 'base1Text', 'base2Text'):
+      getattr(self, name).extend(getattr(other, name))
+
+  def getRows(self, index):
+    return range(self.starts[index], self.starts[index + 1])
+
+  def getSpaRows(self, spa):
+    return self.bySpa.get(spa, array('I'))
+
+  # ids of spells with the given SPA in a slot that passes the optional test. for example
+  # findSpells(339, lambda row: table.base2[row] > 0)
+  def findSpells(self, spa, test=None):
+    found = dict()
+    for row in self.getSpaRows(spa):
+      if test is None or test(row):
+        found[self.ids[self.spell[row]]] = True
+    return list(found)
+
+# walk the effect slots of a spell (in reverse order) and return the ADPS value, damaging type,
+# proc links as (type, spell id) pairs and any SPA 411 class masks still to be applied
+def scanSlots(slots, index, adps):
+  damaging = 0
+  charm = False
+  requireDet = None
+  links = []
+  classMasks = []
+
+  spas = slots.spa
+  base1 = slots.base1
+  base2 = slots.base2
+  adpsSize = SPA_RULES.size
+  adpsBits = SPA_RULES.adps
+  detrimentalBits = SPA_RULES.detrimental
+  beneficialBits = SPA_RULES.beneficial
+  minBase1 = SPA_RULES.minBase1
+  maxBase1 = SPA_RULES.maxBase1
+
+  for row in reversed(slots.getRows(index)):
+    spa = spas[row]
+    value1 = base1[row]
+
+    if spa == 22:
+      charm = True
+    if spa == 138:
+      requireDet = (slots.base1Text[row] == '0')
+
+    if spa == 0 or spa == 79 or spa == 100:
+      if value1 > 0:
+        damaging = -1
+      else:
+        damaging = 1
+      if value1 <= -50000000:
+        damaging = 2 # BANE
+
+    if 0 <= spa < adpsSize and adpsBits[spa] and minBase1[spa] <= value1 < maxBase1[spa]:
+      if requireDet is None:
+        adps |= adpsBits[spa]
+      else:
+        adps |= detrimentalBits[spa] if requireDet else beneficialBits[spa]
+
+    if spa == 339 and base2[row] > 0:
+      links.append(('spa339', slots.base2Text[row]))
+    elif spa == 340 and base2[row] > 0:
+      links.append(('spa340', slots.base2Text[row]))
+    elif spa == 373 and base2[row] > 0:
+      links.append(('spa373', slots.base1Text[row]))
+    elif spa == 374 and base2[row] > 0:
+      links.append(('spa374', slots.base2Text[row]))
+    elif spa == 406 and value1 > 0:
+      links.append(('spa406', slots.base1Text[row]))
+    elif spa == 411:
+      classMasks.append(value1 >> 1)
+
+  # filter some obvious non-player adps
+  if charm and adps != 0:
+    adps = 0
+
+  return adps, damaging, links, classMasks
+
+# add focus AAs based on line and spell ID
+def getFocusBonus(focus, spellLine, intId):
+  bonus = 0
+  if spellLine > 0 and spellLine in focus:
+    bonus = bonus + focus[spellLine]
+  if intId > 0 and intId in focus:
+    bonus = bonus + focus[intId]
+  return bonus
+
+# parse a single ^ delimited row from spells_us.txt, its effect slots are added to slots
+# returns None for spells that are ignored
+def parseSpellRow(data, slots):
+  id = data[0]
+  intId = int(id)
+  name = data[1]
+
+  if isIgnored(name):
+    return None
+
+  spellRange = int(data[4])
+  castTime = int(data[8])
+  lockoutTime = int(data[9])
+  recastTime = int(data[10])
+  maxDuration = int(data[12])
+  manaCost = int(data[14])
+  beneficial = int(data[28])
+  resist = int(data[29])
+  spellTarget = int(data[30])
+  skill = int(data[32])
+  recourse = data[81]
+  songWindow = int(data[84])
+  reflectable = int(data[91])
+  hateMod = int(data[92])
+  endurance = int(data[96])
+  combatSkill = int(data[98])
+  hateOver = int(data[99])
+  maxHits = int(data[102])
+  mgb = int(data[110])
+  dispellable = int(data[111])
+  focusable = int(data[122]) # focusable
+  blockable = int(data[130])
+  groupId = int(data[132])
+  rank = int(data[133]) # AA rank
+  maxTargets = int(data[142])
+  origDuration = maxDuration
+
+  spellLine = 0
+  if data[164].isdigit():
+    spellLine = int(data[164])
+
+  if isTargetRing(name):
+    spellTarget = 45
+
+  # add focus AAs for additional hits
+  maxHits = maxHits + getFocusBonus(MAX_HITS, spellLine, intId)
+
+  # ignore long term beneficial buffs like FIRE DAMAGE
+  if origDuration == 1950 and castTime == 0 and lockoutTime == 0 and recastTime == 0 and beneficial != 0:
+    return None
+
+  classMask = 0
+  minLevel = 255
+  for i in range(36, 36+16):
+    level = int(data[i])
+    if level <= 254:
+      classMask += (1 << (i - 36))
+      minLevel = min(minLevel, level)
+
+  if origDuration == 1950:
+    classMask = 65535
+
+  adps = getAdpsValueFromSkill(0, skill, endurance)
+  adps, damaging, links, classMasks = scanSlots(slots, slots.addSpell(id, data[-1]), adps)
+
+  # apply 100% buff extension
+  if beneficial != 0 and focusable == 0 and combatSkill == 0 and maxDuration > 1:
+    maxDuration = maxDuration * 2
+
+  # add focus AAs that extend duration
+  maxDuration = maxDuration + getFocusBonus(ADPS_EXT_DUR, spellLine, intId)
+
+  if int(recourse) > 0:
+    links.append(('recourse', recourse))
+
+  return buildInfo(id, intId, name, abbreviate(name), adps, castTime, damaging, beneficial, blockable, combatSkill, classMask,
+                   dispellable, focusable, hateMod, hateOver, lockoutTime, manaCost, maxDuration, mgb, origDuration, maxHits,
+                   links, classMasks, resist, skill, rank, minLevel, recastTime, spellTarget, spellRange, songWindow)
+
+# one parsed spell. __slots__ stores the fields in a fixed size record instead of a dict per spell
+class SpellInfo:
+  __slots__ = ( 'abbrv', 'adps', 'castTime', 'damaging', 'id', 'intId', 'beneficial', 'blockable', 'combatSkill',
+                'classMask', 'dispellable', 'focusable', 'hateMod', 'hateOver', 'lockoutTime', 'manaCost',
+                'maxDuration', 'mgb', 'origDuration', 'maxHits', 'name', 'links', 'procs', 'spa411', 'resist', 'skill',
+                'rank', 'level', 'recastTime', 'spellTarget', 'spellRange', 'songWindow', 'landsOnYouAmbiguity',
+                'landsOnOtherAmbiguity', 'landsOnYou', 'landsOnOther', 'wearOff' )
+
+  def __init__(self):
+    self.landsOnYou = ''
+    self.landsOnOther = ''
+    self.wearOff = ''
+
+  def copy(self):
+    info = SpellInfo.__new__(SpellInfo)
+    for field in self.__slots__:
+      setattr(info, field, getattr(self, field))
+    return info
+
+  def asDict(self):
+    return { field: getattr(self, field) for field in self.__slots__ }
+
+def buildInfo(id, intId, name, abbrv, adps, castTime, damaging, beneficial, blockable, combatSkill, classMask,
+              dispellable, focusable, hateMod, hateOver, lockoutTime, manaCost, maxDuration, mgb, origDuration, maxHits,
+              links, classMasks, resist, skill, rank, level, recastTime, spellTarget, spellRange, songWindow):
+  info = SpellInfo()
+  info.abbrv = sys.intern(abbrv)
+  info.adps = adps
+  info.castTime = castTime
+  info.damaging = damaging
+  info.id = id
+  info.intId = intId
+  info.beneficial = beneficial
+  info.blockable = blockable
+  info.combatSkill = combatSkill
+  info.classMask = classMask
+  info.dispellable = dispellable
+  info.focusable = focusable
+  info.hateMod = hateMod
+  info.hateOver = hateOver
+  info.lockoutTime = lockoutTime
+  info.manaCost = manaCost
+  info.maxDuration = maxDuration
+  info.mgb = mgb
+  info.origDuration = origDuration
+  info.maxHits = maxHits
+  info.name = sys.intern(name)
+  info.links = links
+  info.procs = [link[1] for link in links]
+  info.spa411 = classMasks
+  info.resist = resist
+  info.skill = skill
+  info.rank = rank
+  info.level = level
+  info.recastTime = recastTime
+  info.spellTarget = spellTarget
+  info.spellRange = spellRange
+  info.songWindow = songWindow
+  info.landsOnYouAmbiguity = False
+  info.landsOnOtherAmbiguity = False
+  return info
+
+def parseSpellFile(fileName, slots=None):
+  slots = SlotTable() if slots is None else slots
+  for line in open(fileName, 'r'):
+    info = parseSpellRow(line.split('^'), slots)
+    if info:
+      yield info
+
+# split a file into byte ranges that start and end on line boundaries
+def getChunks(fileName, parts):
+  size = os.path.getsize(fileName)
+  offsets = [0]
+  with open(fileName, 'rb') as data:
+    for i in range(1, parts):
+      data.seek(max(size * i // parts, offsets[-1]))
+      if data.tell() > 0:
+        data.seek(data.tell() - 1)
+        data.readline()
+      offsets.append(data.tell())
+  offsets.append(size)
+  return [(start, end) for start, end in zip(offsets, offsets[1:]) if end > start]
+
+def parseSpellChunk(fileName, start, end):
+  with open(fileName, 'rb') as data:
+    data.seek(start)
+    chunk = data.read(end - start)
+
+  # decode the same way open() in text mode would
+  results = []
+  slots = SlotTable()
+  for line in io.TextIOWrapper(io.BytesIO(chunk), encoding=locale.getpreferredencoding(False)):
+    info = parseSpellRow(line.split('^'), slots)
+    if info:
+      results.append(info)
+  return results, slots
+
+# rows are parsed in a process pool and handed back in file order so the merge is the
+# same as a single process run
+def parseSpellFileParallel(fileName, workers, slots=None):
+  chunks = getChunks(fileName, workers * 4)
+  with ProcessPoolExecutor(workers) as pool:
+    for results, chunkSlots in pool.map(parseSpellChunk, *zip(*[(fileName, start, end) for start, end in chunks])):
+      if slots is not None:
+        slots.extend(chunkSlots)
+      yield from results
+
+# cached rows are only valid for the code and SPA rules that derived them
+def getCodeVersion():
+  version = hashlib.blake2b(digest_size=16)
+  for fileName in (__file__, sparules.__file__, SpaRulesFile):
+    with open(fileName, 'rb') as source:
+      version.update(source.read())
+  return version.hexdigest()
+
+def loadCache(fileName):
+  version = getCodeVersion()
+  if os.path.isfile(fileName):
     try:
-      id = data[0]
-      landOnYou = data[3]
-      landOnOther = data[4]
-      wearOff = data[5]
-      DBSTRINGS[id] = { 'landsOnYou': landOnYou, 'landsOnOther': landOnOther, 'wearOff': wearOff }
-
-      if landOnYou:
-        if landOnYou not in UNIQUE_YOU:
-          UNIQUE_YOU[landOnYou] = True
-        else:
-          UNIQUE_YOU[landOnYou] = False
-
-      if landOnOther:
-        if landOnOther not in UNIQUE_OTHER:
-          UNIQUE_OTHER[landOnOther] = True
-        else:
-          UNIQUE_OTHER[landOnOther] = False
-    except ValueError:
-      pass
-
-# parse the spell file
-if os.path.isfile(DBSpellsFile):
-  print('Loading Spells DB from %s' % DBSpellsFile)
-
+      with open(fileName, 'rb') as cacheFile:
+        cache = pickle.load(cacheFile)
+      if cache.get('version') == version:
+        return cache
+      print('Ignoring %s, it was built by a different version of this script' % fileName)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+      print('Ignoring unreadable cache %s' % fileName)
+  return { 'version': version, 'rows': dict(), 'output': dict() }
+
+def saveCache(fileName, cache):
+  with open(fileName + '.tmp', 'wb') as cacheFile:
+    pickle.dump(cache, cacheFile, pickle.HIGHEST_PROTOCOL)
+  os.replace(fileName + '.tmp', fileName)
+
+# same as parseSpellFile but rows are keyed by a fingerprint of the raw line and only rows
+# not found in the previous run are parsed again. ids of the re-parsed rows are added to reparsed
+def parseSpellFileCached(fileName, previous, current, reparsed, slots=None):
+  slots = SlotTable() if slots is None else slots
+  for line in open(fileName, 'r'):
+    key = hashlib.blake2b(line.encode(), digest_size=16).digest()
+    if key in previous:
+      info = previous[key]
+    else:
+      data = line.split('^')
+      info = parseSpellRow(data, slots)
+      reparsed.add(data[0])
+
+    current[key] = info
+    if info:
+      # merging updates the class mask and strings so keep the cached row as it was parsed
+      yield info.copy()
+
+def printChanges(previous, output, reparsed):
+  if not previous:
+    print('No previous run found, derived all %d spells' % len(output))
+    return
+
+  added = [id for id in output if id not in previous]
+  removed = [id for id in previous if id not in output]
+  updated = [id for id in output if id in previous and output[id] != previous[id]]
+  linked = [id for id in updated if id not in reparsed]
+
+  print('Changed spells: %d added, %d removed, %d updated (%d through name or proc links), %d rows re-parsed' %
+        (len(added), len(removed), len(updated), len(linked), len(reparsed)))
+  for id in sorted(added, key=int):
+    print('  + %s %s' % (id, output[id].split('^')[1]))
+  for id in sorted(removed, key=int):
+    print('  - %s %s' % (id, previous[id].split('^')[1]))
+  for id in sorted(updated, key=int):
+    before = previous[id].split('^')
+    after = output[id].split('^')
+    fields = [OUTPUT_FIELDS[i] for i in range(len(after)) if before[i] != after[i]]
+    print('  ~ %s %s: %s%s' % (id, after[1], ', '.join(fields), '' if id in reparsed else ' (linked)'))
+
+# combine the parsed rows in file order. spells sharing a name share their class masks and
+# every proc/recourse link is recorded as proc id -> id of the spell that casts it
+def mergeSpells(rows, dbStrings, uniqueYou, uniqueOther):
   spells = dict()
-  recourses = dict()
-  spa85s = dict()
-  spa339s = dict()
-  spa340s = dict()
-  spa373s = dict()
-  spa374s = dict()
-  spa406s = dict()
   byName = dict()
+  links = { linkType: dict() for linkType in LINK_TYPES }
 
-  for line in open(DBSpellsFile, 'r'):
-    procs = []
-    data = line.split('^')
-    id = data[0]
-    intId = int(id)
-    name = data[1]
-
-    if len(name) <= 3:
-      continue
-
-    skip = False
-    for ig in IGNORE:
-      if ig in name:
-        skip = True
-       
-    if skip:
-      continue
-
-    spellRange = int(data[4])
-    castTime = int(data[8])
-    lockoutTime = int(data[9])
-    recastTime = int(data[10])
-    maxDuration = int(data[12])
-    manaCost = int(data[14])
-    beneficial = int(data[28])
-    resist = int(data[29])
-    spellTarget = int(data[30])
-    skill = int(data[32])
-    recourse = data[81]
-    songWindow = int(data[84])
-    reflectable = int(data[91])
-    hateMod = int(data[92])
-    endurance = int(data[96])
-    combatSkill = int(data[98])
-    hateOver = int(data[99])
-    maxHits = int(data[102])
-    mgb = int(data[110])
-    dispellable = int(data[111])
-    focusable = int(data[122]) # focusable
-    blockable = int(data[130])
-    groupId = int(data[132])
-    rank = int(data[133]) # AA rank
-    maxTargets = int(data[142])
-    origDuration = maxDuration
-
-    spellLine = 0
-    if data[164].isdigit():
-      spellLine = int(data[164])
-
-    if isTargetRing(name):
-      spellTarget = 45  
-
-    #if spellTarget == 8 and maxTargets > 5:
-    #  print("%s has targets %d" % (name, maxTargets))
-
-    # add focus AAs for additional hits based on line
-    if spellLine > 0 and spellLine in MAX_HITS:
-      maxHits = maxHits + MAX_HITS[spellLine]
-
-    # add focus AAs for additional hits based on spell ID
-    if intId > 0 and intId in MAX_HITS:
-      maxHits = maxHits + MAX_HITS[intId]
-    
-    # ignore long term beneficial buffs like FIRE DAMAGE
-    # howerver allow their SPAs to be checked for procs so continue at the end
-    if origDuration == 1950 and castTime == 0 and lockoutTime == 0 and recastTime == 0 and beneficial != 0:
-      continue
-	  
-    classMask = 0
-    minLevel = 255
-    for i in range(36, 36+16):
-      level = int(data[i])
-      if level <= 254:
-        classMask += (1 << (i - 36))
-        minLevel = min(minLevel, level)
-
-    if origDuration == 1950:
-      classMask = 65535
+  for info in rows:
+    id = info.id
+    name = info.name
+    classMask = info.classMask
 
     if name in byName:
       for spell in byName[name]:
-        if spell['name'] == name and spell['classMask'] != classMask:
+        if spell.name == name and spell.classMask != classMask:
           if classMask == 0:
-            classMask = spell['classMask']
-          elif spell['classMask'] == 0 and classMask > 0:
-            spell['classMask'] = classMask
-          
-          if spell['classMask'] != classMask:
-            newMask = spell['classMask'] | classMask
-            spell['classMask'] = newMask
+            classMask = spell.classMask
+          elif spell.classMask == 0 and classMask > 0:
+            spell.classMask = classMask
+
+          if spell.classMask != classMask:
+            newMask = spell.classMask | classMask
+            spell.classMask = newMask
             classMask = newMask
 
-    adps = getAdpsValueFromSkill(0, skill, endurance)
-    damaging = 0
-    charm = False
-    requireDet = None
-
-    #if groupId in [126120010, 126120330, 126120480]:
-    #if 'New Beam' in name or groupId in [126130220]:
-    #if spellLine == 100120270:
-    #  print(name)
-      #print("%s and %d" % (name, minLevel))
-    #  print(name)
-    #  print(spellLine)
-    #  print(groupId)
-
-    # process in reverse order
-    slots = data[-1].split('$')
-    slots.reverse()
-
-    for slot in slots:
-      values = slot.split('|')
-      if len(values) > 1:
-        spa = int(values[1])
-        base1 = values[2]
-        base2 = values[3]
-        
-        if spa == 22:
-          charm = True
-        if spa == 138:
-          requireDet = (base1 == '0')
-
-        if spa == 0 or spa == 79 or spa == 100:
-          if int(float(base1)) > 0:
-            damaging = -1
-          else:
-            damaging = 1
-          if int(float(base1)) <= -50000000:
-            damaging = 2 # BANE
-            
-        if spa in ADPS_LIST:
-          if spa in ADPS_B1_MIN:
-            if int(float(base1)) >= ADPS_B1_MIN[spa]:
-              adps = getAdpsValueFromSpa(adps, spa, requireDet)
-          elif spa in ADPS_B1_MAX:
-            if int(float(base1)) < ADPS_B1_MAX[spa]:
-              adps = getAdpsValueFromSpa(adps, spa, requireDet)
-          elif int(float(base1)) >= 0:
-            adps = getAdpsValueFromSpa(adps, spa, requireDet)
-            
-        if spa == 85 and int(float(base1)) > 0:
-          # testing
-          if spellTarget != 6:
-            spa85s[base1] = base1
-        if spa == 339 and int(float(base2)) > 0:
-          spa339s[base2] = id
-          procs.append(base2)
-        elif spa == 340 and int(float(base2)) > 0:
-          spa340s[base2] = id
-          procs.append(base2)
-        elif spa == 373 and int(float(base2)) > 0:
-          spa373s[base1] = id 
-          procs.append(base1)
-        elif spa == 374 and int(float(base2)) > 0:
-          spa374s[base2] = id 
-          procs.append(base2)
-        elif spa == 406 and int(float(base1)) > 0:
-          spa406s[base1] = id
-          procs.append(base1)
-        elif spa == 411 and classMask == 0:
-          classMask = (int(float(base1)) >> 1)
-		  
-    # apply 100% buff extension
-    if beneficial != 0 and focusable == 0 and combatSkill == 0 and maxDuration > 1:
-      maxDuration = maxDuration * 2
-
-    # add focus AAs that extend duration based on line
-    if spellLine > 0 and spellLine in ADPS_EXT_DUR:
-      maxDuration = maxDuration + ADPS_EXT_DUR[spellLine]
-      
-    # add focus AAs that extend duration based on spell ID
-    if intId > 0 and intId in ADPS_EXT_DUR:
-      maxDuration = maxDuration + ADPS_EXT_DUR[intId]
-  
-    info = dict()
-    if int(recourse) > 0:
-      recourses[recourse] = id
-      procs.append(recourse)
-
-    # filter some obvious non-player adps
-    if charm and adps != 0:
-      adps = 0
-
-    abbrv = abbreviate(name)
-    info['abbrv'] = abbrv
-    info['adps'] = adps
-    info['castTime'] = castTime
-    info['damaging'] = damaging
-    info['id'] = id
-    info['intId'] = intId
-    info['beneficial'] = beneficial
-    info['blockable'] = blockable
-    info['combatSkill'] = combatSkill
-    info['classMask'] = classMask
-    info['dispellable'] = dispellable
-    info['focusable'] = focusable
-    info['hateMod'] = hateMod
-    info['hateOver'] = hateOver
-    info['lockoutTime'] = lockoutTime
-    info['manaCost'] = manaCost
-    info['maxDuration'] = maxDuration
-    info['mgb'] = mgb
-    info['origDuration'] = origDuration
-    info['maxHits'] = maxHits
-    info['name'] = name
-    info['procs'] = procs
-    info['resist'] = resist
-    info['skill'] = skill
-    info['rank'] = rank
-    info['level'] = minLevel
-    info['recastTime'] = recastTime
-    info['spellTarget'] = spellTarget
-    info['spellRange'] = spellRange
-    info['songWindow'] = songWindow
-    info['landsOnYouAmbiguity'] = False
-    info['landsOnOtherAmbiguity'] = False
-
-    if id in DBSTRINGS:
-      info['landsOnYou'] = DBSTRINGS[id]['landsOnYou']
-      info['landsOnOther'] = DBSTRINGS[id]['landsOnOther']
-      info['wearOff'] = DBSTRINGS[id]['wearOff']
-      info['landsOnYouAmbiguity'] = (info['landsOnYou'] in UNIQUE_YOU and UNIQUE_YOU[info['landsOnYou']] == False)
-      info['landsOnOtherAmbiguity'] = (info['landsOnOther'] in UNIQUE_OTHER and UNIQUE_OTHER[info['landsOnOther']] == False)
+    for mask in info.spa411:
+      if classMask == 0:
+        classMask = mask
+
+    info.classMask = classMask
+
+    for linkType, procId in info.links:
+      links[linkType][procId] = id
+
+    if id in dbStrings:
+      info.landsOnYou = sys.intern(dbStrings[id]['landsOnYou'])
+      info.landsOnOther = sys.intern(dbStrings[id]['landsOnOther'])
+      info.wearOff = sys.intern(dbStrings[id]['wearOff'])
+      info.landsOnYouAmbiguity = (info.landsOnYou in uniqueYou and uniqueYou[info.landsOnYou] == False)
+      info.landsOnOtherAmbiguity = (info.landsOnOther in uniqueOther and uniqueOther[info.landsOnOther] == False)
 
     # Overdrive Punch the proc and main spell have the same name. Just ignore the non-damaging versions
-    if name != 'Overdrive Punch' or beneficial == 1:
+    if name != 'Overdrive Punch' or info.beneficial == 1:
       spells[id] = info
 
     if name not in byName:
@@ -422,30 +727,23 @@ if os.path.isfile(DBSpellsFile):
     else:
       byName[name].append(info)
 
-  for i in range(6):
-    for id in spells:
-      if id in recourses and spells[recourses[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[recourses[id]]['classMask']
-      if id in spa339s and spells[spa339s[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[spa339s[id]]['classMask']
-      if id in spa340s and spells[spa340s[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[spa340s[id]]['classMask']
-      if id in spa373s and spells[spa373s[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[spa373s[id]]['classMask']
-      if id in spa374s and spells[spa374s[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[spa374s[id]]['classMask']
-      if id in spa406s and spells[spa406s[id]]['classMask'] > 0:
-        spells[id]['classMask'] |= spells[spa406s[id]]['classMask']
-      if spells[id]['classMask'] > 0:
-        for proc in spells[id]['procs']:
-          if proc in spells and spells[proc]['classMask'] == 0:
-            spells[proc]['classMask'] |= spells[id]['classMask']
-
-  output = open('output.txt', 'w')
-  for key in sorted(spells):
-    sp = spells[key]
-    data = '%s^%s^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%s^%s^%s' % (sp['intId'], sp['name'], sp['level'], sp['maxDuration'], sp['beneficial'], sp['maxHits'], sp['spellTarget'], sp['classMask'], sp['damaging'], sp['combatSkill'], sp['resist'], sp['songWindow'], sp['adps'], sp['mgb'], sp['rank'], sp['landsOnYouAmbiguity'], sp['landsOnOtherAmbiguity'], sp['landsOnYou'], sp['landsOnOther'], sp['wearOff'])
-    output.write(data)
+  return spells, links
+
+# procs and recourses inherit the class masks of the spells that cast them
+def propagateClassMasks(spells, links):
+  graph = SpellGraph.fromSpells(spells, links)
+  masks, passes = graph.closeClassMasks({ id: spell.classMask for id, spell in spells.items() })
+  for id, spell in spells.items():
+    spell.classMask = masks[id]
+  return graph
+
+def formatSpell(sp):
+  return '%s^%s^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%d^%s^%s^%s' % (sp.intId, sp.name, sp.level, sp.maxDuration, sp.beneficial, sp.maxHits, sp.spellTarget, sp.classMask, sp.damaging, sp.combatSkill, sp.resist, sp.songWindow, sp.adps, sp.mgb, sp.rank, sp.landsOnYouAmbiguity, sp.landsOnOtherAmbiguity, sp.landsOnYou, sp.landsOnOther, sp.wearOff)
+
+def writeOutput(lines, fileName):
+  output = open(fileName, 'w')
+  for key in sorted(lines):
+    output.write(lines[key])
     output.write('\n')
   output.write('900001^Glyph of Destruction I^254^20^1^0^6^65407^0^0^0^0^3^0^1^0^1^^ is infused for destruction.^Your Glyph of Destruction fades away.')
   output.write('\n')
@@ -455,5 +753,101 @@ if os.path.isfile(DBSpellsFile):
   output.write('\n')
   output.write('900004^Glyph of Destruction IV^254^20^1^0^6^65407^0^0^0^0^3^0^4^0^1^^ is infused for destruction.^Your Glyph of Destruction fades away.')
   output.write('\n')
-  output.write('900005^Glyph of Destruction V^254^20^1^0^6^65407^0^0^0^0^3^0^5^^0^1^ is infused for destruction.^Your Glyph of Destruction fades away.')
+  output.write('900005^Glyph of Destruction V^254^20^1^0^6^65407^0^0^0^0^3^0^5^0^1^^ is infused for destruction.^Your Glyph of Destruction fades away.')
   output.write('\n')
+  output.close()
+
+def main():
+  parser = argparse.ArgumentParser(description='Generate the spell data included with the parser')
+  mode = parser.add_mutually_exclusive_group()
+  mode.add_argument('--columnar', action='store_true', help='parse %s into typed NumPy columns (requires numpy)' % DBSpellsFile)
+  mode.add_argument('--incremental', nargs='?', const=CacheFile, metavar='CACHE',
+                    help='only re-parse rows that changed since the run saved in CACHE (default %s)' % CacheFile)
+  mode.add_argument('--workers', type=int, metavar='N', help='parse %s with N processes' % DBSpellsFile)
+  parser.add_argument('--stream-strings', action='store_true',
+                      help='join %s while merging instead of loading it first (files must be sorted by id)' % DBSpellsStrFile)
+  parser.add_argument('--binary', nargs='?', const='output.bin', metavar='FILE',
+                      help='also write the spells in the binary format read by spellbin.py (default output.bin)')
+  parser.add_argument('--profile', nargs='?', const='createdata.profile.json', metavar='FILE',
+                      help='time each phase, trace its memory use and write a JSON report (default createdata.profile.json)')
+  args = parser.parse_args()
+
+  profile = None
+  slots = None
+  if args.profile:
+    from spellprofile import Profile
+    profile = Profile()
+    slots = profile.slots
+  phase = profile.phase if profile else lambda name: contextlib.nullcontext()
+
+  with phase('strings'):
+    if args.stream_strings:
+      dbStrings, uniqueYou, uniqueOther = streamStrings(DBSpellsStrFile)
+    else:
+      dbStrings, uniqueYou, uniqueOther = loadStrings(DBSpellsStrFile)
+
+  # parse the spell file
+  if os.path.isfile(DBSpellsFile):
+    print('Loading Spells DB from %s' % DBSpellsFile)
+
+    with phase('rows'):
+      if args.columnar:
+        from spellcolumns import parseSpellColumns
+        rows = parseSpellColumns(DBSpellsFile, slots)
+      elif args.incremental:
+        cache = loadCache(args.incremental)
+        cachedRows = dict()
+        reparsed = set()
+        rows = parseSpellFileCached(DBSpellsFile, cache['rows'], cachedRows, reparsed, slots)
+      elif args.workers and args.workers > 1:
+        rows = parseSpellFileParallel(DBSpellsFile, args.workers, slots)
+      else:
+        rows = parseSpellFile(DBSpellsFile, slots)
+
+      # rows are normally parsed as the merge reads them
+      if profile:
+        rows = list(rows)
+
+    with phase('merge'):
+      spells, links = mergeSpells(rows, dbStrings, uniqueYou, uniqueOther)
+      # the rest of spells_us_str.txt is not needed once every spell has been merged
+      if args.stream_strings:
+        dbStrings.close()
+
+    if profile:
+      before = { id: spell.classMask for id, spell in spells.items() }
+    with phase('propagate'):
+      graph = propagateClassMasks(spells, links)
+
+    with phase('write'):
+      output = { id: formatSpell(sp) for id, sp in spells.items() }
+      writeOutput(output, OutputFile)
+
+    # tables EQDataStore would otherwise build at startup
+    with phase('sidecars'):
+      from spellsidecars import writeSidecars
+      from spellmessages import writeMessageIndex
+      writeSidecars(OutputFile)
+      writeMessageIndex(OutputFile)
+
+    if args.binary:
+      with phase('binary'):
+        from spellbin import writeBinary
+        writeBinary(OutputFile, args.binary)
+
+    if args.incremental:
+      printChanges(cache['output'], output, reparsed)
+      if reparsed or len(cachedRows) != len(cache['rows']) or output != cache['output']:
+        saveCache(args.incremental, { 'version': cache['version'], 'rows': cachedRows, 'output': output })
+
+    if profile:
+      profile.countIgnored(DBSpellsFile)
+      profile.countSpells(spells)
+      profile.countPropagation(graph, before, spells)
+
+  if profile:
+    mode = 'columnar' if args.columnar else 'incremental' if args.incremental else 'workers' if args.workers else 'row'
+    profile.write(args.profile, mode)
+
+if __name__ == '__main__':
+  main()
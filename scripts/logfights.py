@@ -0,0 +1,188 @@
+# Splits a large EQ log into one file per fight for building a replay corpus
+#
+#   python logfights.py eqlog_Name_server.txt --out fights [--gap 30] [--workers 8]
+#
+# A fight is a run of combat lines (damage, heals, misses and deaths) where no two are more than --gap
+# seconds apart. Runs with fewer than --min-lines combat lines or less than --min-density combat lines
+# per minute are dropped as stray hits or buffing. Each fight is written with every line between its
+# first and last combat line, and the manifest lists them as source=destination pairs, with the time,
+# length and mobs slain in a comment, so logsim.py --manifest can replay them.
+#
+# The log is cut into newline aligned byte ranges that a process pool scans on its own. The runs at
+# the end of one range and the start of the next are joined when the gap between them is short enough
+# so the fights are the same as scanning the log in one pass.
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import re
+import time
+
+from logsim import parse_date_from_line
+
+COMBAT = re.compile(r" points of (?:[a-z]+ )?damage| damage from | has been slain by | have slain | healed .* hit points"
+                    r"| tries to [a-z]+ .*, but ")
+SLAIN = re.compile(r"^(.+) has been slain by |^You have slain (.+)!")
+READ_SIZE = 1 << 20
+# mobs kept per fight for the manifest
+MAX_SLAIN = 5
+
+
+class Segment:
+    __slots__ = ("first_time", "last_time", "start", "end", "lines", "slain")
+
+    def __init__(self, time, start, end):
+        self.first_time = time
+        self.last_time = time
+        # bytes from the first combat line through the end of the last one
+        self.start = start
+        self.end = end
+        self.lines = 1
+        self.slain = []
+
+    def add_slain(self, name):
+        if len(self.slain) < MAX_SLAIN and name not in self.slain:
+            self.slain.append(name)
+
+    def join(self, other):
+        self.last_time = other.last_time
+        self.end = other.end
+        self.lines += other.lines
+        for name in other.slain:
+            self.add_slain(name)
+
+    def get_seconds(self):
+        return (self.last_time - self.first_time).total_seconds()
+
+    def get_density(self):
+        # combat lines per minute, a single second counts as one
+        return self.lines * 60 / max(self.get_seconds(), 1)
+
+
+def get_ranges(log_file, count):
+    # about count byte ranges that each start at the beginning of a line
+    size = os.path.getsize(log_file)
+    starts = [0]
+    with open(log_file, "rb") as log:
+        for i in range(1, count):
+            log.seek(size * i // count)
+            log.readline()
+            position = log.tell()
+            if starts[-1] < position < size:
+                starts.append(position)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def scan_range(log_file, start, end, gap):
+    # combat runs of the lines starting in [start, end) with nothing dropped yet
+    segments = []
+    current = None
+    offset = start
+    with open(log_file, "rb") as log:
+        log.seek(start)
+        while offset < end:
+            raw = log.readline()
+            if not raw:
+                break
+            line_start = offset
+            offset += len(raw)
+            line = raw.decode("latin-1")
+            payload = line[26:]
+            if not COMBAT.search(payload):
+                continue
+            line_time = parse_date_from_line(line)
+            if line_time is None:
+                continue
+
+            if current and (line_time - current.last_time).total_seconds() <= gap:
+                current.last_time = max(current.last_time, line_time)
+                current.end = offset
+                current.lines += 1
+            else:
+                current = Segment(line_time, line_start, offset)
+                segments.append(current)
+
+            slain = SLAIN.match(payload)
+            if slain:
+                current.add_slain((slain.group(1) or slain.group(2)).strip())
+    return segments
+
+
+def stitch(ranges_segments, gap):
+    # joins the last run of each range with the first of the next one when they are close enough
+    segments = []
+    for range_segments in ranges_segments:
+        for segment in range_segments:
+            if segments and (segment.first_time - segments[-1].last_time).total_seconds() <= gap:
+                segments[-1].join(segment)
+            else:
+                segments.append(segment)
+    return segments
+
+
+def find_fights(log_file, gap=30, min_lines=20, min_density=10, workers=None):
+    workers = workers or os.cpu_count() or 1
+    # more ranges than workers so a range full of combat does not hold up the rest
+    ranges = get_ranges(log_file, workers * 4 if workers > 1 else 1)
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(scan_range, [log_file] * len(ranges), [start for start, end in ranges],
+                                    [end for start, end in ranges], [gap] * len(ranges)))
+    else:
+        results = [scan_range(log_file, start, end, gap) for start, end in ranges]
+
+    segments = stitch(results, gap)
+    return [segment for segment in segments if segment.lines >= min_lines and segment.get_density() >= min_density]
+
+
+def copy_range(log_file, start, end, file_name):
+    with open(log_file, "rb") as log, open(file_name, "wb") as output:
+        log.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = log.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            output.write(data)
+            remaining -= len(data)
+
+
+def write_fights(log_file, fights, out_dir, manifest_name="manifest.txt"):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_file = os.path.join(out_dir, manifest_name)
+    with open(manifest_file, "w") as manifest:
+        manifest.write(f"# fights in {log_file}, replay with logsim.py --manifest {manifest_file}\n")
+        for number, fight in enumerate(fights, 1):
+            file_name = os.path.join(out_dir, f"fight_{number:04d}.txt")
+            copy_range(log_file, fight.start, fight.end, file_name)
+            slain = ", ".join(fight.slain) or "nothing slain"
+            manifest.write(f"# {fight.first_time:%a %b %d %H:%M:%S %Y}, {fight.get_seconds():.0f}s, "
+                           f"{fight.lines} combat lines: {slain}\n")
+            manifest.write(f"{file_name}={os.path.join(out_dir, f'replay_{number:04d}.txt')}\n")
+    return manifest_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split an EQ log into one file per fight")
+    parser.add_argument("log", help="log to split")
+    parser.add_argument("--out", default="fights", help="directory for the fights and manifest.txt (default fights)")
+    parser.add_argument("--gap", type=float, default=30,
+                        help="seconds without combat that end a fight (default 30)")
+    parser.add_argument("--min-lines", type=int, default=20, help="fewest combat lines in a fight (default 20)")
+    parser.add_argument("--min-density", type=float, default=10,
+                        help="fewest combat lines per minute in a fight (default 10)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes scanning the log (default one per CPU)")
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    fights = find_fights(args.log, args.gap, args.min_lines, args.min_density, args.workers)
+    scanned = time.perf_counter() - begin
+    manifest_file = write_fights(args.log, fights, args.out)
+    size = os.path.getsize(args.log)
+    print(f"Found {len(fights)} fights in {size / 1048576:.1f} MB in {scanned:.2f}s "
+          f"({size / 1048576 / max(scanned, 1e-9):.1f} MB/s), wrote {manifest_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# Generates synthetic EQ combat logs for testing the parser at line rates beyond any real log
+#
+#   python loggen.py --out raid.txt --seconds 600 --rate 20000
+#   python loggen.py --stream live.txt --seconds 60 --rate 5000 --flush interval
+#
+# Lines are melee hits, spell damage, DoT ticks, heals, casts, lands on messages and deaths in the
+# formats the parser reads. Players and pets are named from data/petnames.txt, mobs come from
+# data/npcs.txt and spells from the output.txt written by createdata.py. Damage and heal spells are
+# picked by their damaging type and duration so nukes and DoTs are used the way they would be.
+#
+# --out writes the whole log as fast as possible, one second of timestamps after another. --stream
+# writes every second when it is due through the logsim FileSink so the file grows like a live log.
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from logsink import FLUSH_POLICIES, FileSink
+from logtime import Clock, TimestampCodec
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "EQLogParser", "data")
+NPCS_FILE = os.path.join(DATA_DIR, "npcs.txt")
+PET_NAMES_FILE = os.path.join(DATA_DIR, "petnames.txt")
+SPELLS_FILE = "output.txt"
+
+# relative weight of each kind of line
+DEFAULT_MIX = {"melee": 50, "spell": 10, "dot": 14, "heal": 12, "cast": 8, "landson": 5, "death": 1}
+MELEE_VERBS = [("hit", "hits"), ("slash", "slashes"), ("crush", "crushes"), ("pierce", "pierces"),
+               ("bash", "bashes"), ("kick", "kicks"), ("punch", "punches"), ("backstab", "backstabs"),
+               ("bite", "bites"), ("claw", "claws"), ("strike", "strikes"), ("frenzy on", "frenzies on")]
+MELEE_MODIFIERS = ["", "", "", "", "", " (Critical)", " (Lucky Critical)", " (Flurry)", " (Riposte)", " (Strikethrough)"]
+DAMAGE_TYPES = ["magic", "fire", "cold", "poison", "disease", "chromatic", "corruption"]
+SPELL_MODIFIERS = ["", "", "", "", " (Critical)", " (Lucky Critical)"]
+HEAL_MODIFIERS = ["", "", "", " (Critical)"]
+
+
+def read_names(file_name):
+    with open(file_name, "r") as names:
+        return [line.strip() for line in names if line.strip()]
+
+
+def upper_first(name):
+    return name[:1].upper() + name[1:]
+
+
+def lower_article(name):
+    # mobs start with a capital article at the start of a line and a lower case one anywhere else
+    for article in ("A ", "An ", "The "):
+        if name.startswith(article):
+            return article.lower() + name[len(article):]
+    return name
+
+
+class SpellLists:
+    def __init__(self, spells_file):
+        self.nukes = []
+        self.dots = []
+        self.heals = []
+        self.hots = []
+        self.beneficial = []
+        self.detrimental = []
+        # (name, lands on other message, beneficial) of spells with one
+        self.lands_on = []
+
+        with open(spells_file, "r") as spells:
+            for line in spells:
+                fields = line.rstrip("\n").split("^")
+                if len(fields) < 20:
+                    continue
+                name = fields[1]
+                duration = int(fields[3])
+                beneficial = fields[4] == "1"
+                damaging = int(fields[8])
+                if damaging == 1:
+                    (self.dots if duration else self.nukes).append(name)
+                elif damaging == -1:
+                    (self.hots if duration else self.heals).append(name)
+                (self.beneficial if beneficial else self.detrimental).append(name)
+                # other messages start with a space and follow the name of the target
+                if fields[18].startswith(" "):
+                    self.lands_on.append((name, fields[18], beneficial))
+
+        # any spell will do if a kind is missing
+        every = self.beneficial + self.detrimental
+        if not every:
+            raise ValueError(f"{spells_file} has no spells")
+        for kind in ("nukes", "dots", "heals", "hots", "beneficial", "detrimental"):
+            if not getattr(self, kind):
+                setattr(self, kind, every)
+        if not self.lands_on:
+            self.lands_on = [(name, " is affected.", True) for name in every[:100]]
+
+
+class LogGenerator:
+    def __init__(self, spells, players=20, npcs=5, pets=5, mix=None, you=0.1, seed=None,
+                 npcs_file=NPCS_FILE, pet_names_file=PET_NAMES_FILE):
+        self.random = random.Random(seed)
+        self.spells = spells
+        self.you = you
+
+        names = read_names(pet_names_file)
+        if len(names) < players + pets:
+            raise ValueError(f"{pet_names_file} only has {len(names)} names")
+        chosen = self.random.sample(names, players + pets)
+        self.players = chosen[:players]
+        self.pets = chosen[players:]
+        self.attackers = self.players + self.pets
+        self.npc_pool = read_names(npcs_file)
+        self.npcs = [self.random.choice(self.npc_pool) for i in range(npcs)]
+
+        mix = mix or DEFAULT_MIX
+        self.kinds = [getattr(self, f"make_{kind}") for kind in mix]
+        self.weights = list(mix.values())
+
+    def is_you(self):
+        return self.random.random() < self.you
+
+    def npc(self):
+        return self.random.choice(self.npcs)
+
+    # mob name at the start of a line
+    def first_npc(self):
+        return upper_first(self.random.choice(self.npcs))
+
+    def make_melee(self):
+        rand = self.random
+        npc = self.npc()
+        you_verb, verb = rand.choice(MELEE_VERBS)
+        damage = rand.randint(100, 60000)
+        modifier = rand.choice(MELEE_MODIFIERS)
+        roll = rand.random()
+        if roll < self.you:
+            return f"You {you_verb} {lower_article(npc)} for {damage} points of damage.{modifier}"
+        if roll < 0.2:
+            # the mob hitting back
+            return f"{upper_first(npc)} {verb} {rand.choice(self.players)} for {damage // 4} points of damage.{modifier}"
+        return f"{rand.choice(self.attackers)} {verb} {lower_article(npc)} for {damage} points of damage.{modifier}"
+
+    def make_spell(self):
+        rand = self.random
+        attacker = "You" if self.is_you() else rand.choice(self.players)
+        return (f"{attacker} hit {lower_article(self.npc())} for {rand.randint(1000, 900000)} points of "
+                f"{rand.choice(DAMAGE_TYPES)} damage by {rand.choice(self.spells.nukes)}.{rand.choice(SPELL_MODIFIERS)}")
+
+    def make_dot(self):
+        rand = self.random
+        damage = rand.randint(500, 250000)
+        if self.is_you():
+            return f"{self.first_npc()} has taken {damage} damage from your {rand.choice(self.spells.dots)}."
+        return (f"{self.first_npc()} has taken {damage} damage from {rand.choice(self.players)} by "
+                f"{rand.choice(self.spells.dots)}.{rand.choice(SPELL_MODIFIERS)}")
+
+    def make_heal(self):
+        rand = self.random
+        healer = "You" if self.is_you() else rand.choice(self.players)
+        target = rand.choice(self.players)
+        amount = rand.randint(500, 120000)
+        if rand.random() < 0.4:
+            return f"{healer} healed {target} over time for {amount} hit points by {rand.choice(self.spells.hots)}."
+        actual = rand.randint(0, amount)
+        return (f"{healer} healed {target} for {actual} ({amount}) hit points by {rand.choice(self.spells.heals)}."
+                f"{rand.choice(HEAL_MODIFIERS)}")
+
+    def make_cast(self):
+        rand = self.random
+        if self.is_you():
+            return f"You begin casting {rand.choice(self.spells.beneficial)}."
+        return f"{rand.choice(self.players)} begins to cast a spell. <{rand.choice(self.spells.detrimental)}>"
+
+    def make_landson(self):
+        rand = self.random
+        name, message, beneficial = rand.choice(self.spells.lands_on)
+        target = rand.choice(self.players) if beneficial else self.first_npc()
+        return f"{target}{message}"
+
+    def make_death(self):
+        rand = self.random
+        index = rand.randrange(len(self.npcs))
+        npc = self.npcs[index]
+        # the next mob joins the fight
+        self.npcs[index] = rand.choice(self.npc_pool)
+        if self.is_you():
+            return f"You have slain {lower_article(npc)}!"
+        return f"{upper_first(npc)} has been slain by {rand.choice(self.attackers)}!"
+
+    # the lines of one second with their timestamp, as one string
+    def second(self, stamp, count):
+        kinds = self.random.choices(self.kinds, self.weights, k=count)
+        return "".join([f"{stamp} {kind()}\n" for kind in kinds])
+
+    # (epoch second, text) for every second of the log
+    def seconds(self, start, seconds, rate, codec=None):
+        codec = codec or TimestampCodec()
+        for second in range(int(start), int(start) + seconds):
+            yield second, self.second(codec.format(second), rate)
+
+
+def parse_mix(text):
+    # "melee=60,heal=20" changes those weights and leaves the rest of DEFAULT_MIX as it is
+    mix = dict(DEFAULT_MIX)
+    for part in text.split(","):
+        if part.strip():
+            kind, weight = part.split("=")
+            kind = kind.strip()
+            if kind not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f"unknown line kind {kind}, use {', '.join(DEFAULT_MIX)}")
+            mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("at least one line kind needs a weight")
+    return {kind: weight for kind, weight in mix.items() if weight > 0}
+
+
+def write_log(generator, file_name, start, seconds, rate):
+    lines = 0
+    size = 0
+    with open(file_name, "w", buffering=1 << 20) as output:
+        for second, text in generator.seconds(start, seconds, rate):
+            output.write(text)
+            lines += rate
+            size += len(text)
+    return lines, size
+
+
+async def stream_log(generator, sink, seconds, rate, clock):
+    # each second is written when it is due, with the time it is written at as its timestamp
+    lines = 0
+    size = 0
+    late = 0.0
+    start = clock.time()
+    start_wall = clock.wall()
+    for second, text in generator.seconds(start_wall, seconds, rate):
+        due = start + (second - int(start_wall))
+        await sink.sleep_until(due)
+        late = max(late, clock.time() - due)
+        await sink.write(text)
+        lines += rate
+        size += len(text)
+    return lines, size, late
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic EQ combat logs")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out", help="write the log to this file as fast as possible")
+    output.add_argument("--stream", metavar="FILE", help="append to this file in real time like a live log")
+    parser.add_argument("--seconds", type=int, default=60, help="seconds of log to generate (default 60)")
+    parser.add_argument("--rate", type=int, default=1000, help="lines per second of log (default 1000)")
+    parser.add_argument("--players", type=int, default=20, help="players in the fight (default 20)")
+    parser.add_argument("--pets", type=int, default=5, help="named pets fighting with them (default 5)")
+    parser.add_argument("--npcs", type=int, default=5, help="mobs fighting at the same time (default 5)")
+    parser.add_argument("--you", type=float, default=0.1,
+                        help="fraction of lines from the point of view of the log owner (default 0.1)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weights of the line kinds like melee=60,death=2 (default %s)" %
+                             ",".join(f"{kind}={weight}" for kind, weight in DEFAULT_MIX.items()))
+    parser.add_argument("--spells", default=SPELLS_FILE, help=f"spell data from createdata.py (default {SPELLS_FILE})")
+    parser.add_argument("--start", type=float, help="epoch second of the first line with --out (default now)")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable logs")
+    parser.add_argument("--flush", choices=FLUSH_POLICIES, default="group", help="flush policy with --stream (default group)")
+    args = parser.parse_args()
+
+    if args.rate <= 0 or args.seconds <= 0:
+        parser.error("--rate and --seconds have to be greater than 0")
+
+    generator = LogGenerator(SpellLists(args.spells), players=args.players, npcs=args.npcs, pets=args.pets,
+                             mix=args.mix, you=args.you, seed=args.seed)
+    begin = time.perf_counter()
+    if args.out:
+        lines, size = write_log(generator, args.out, time.time() if args.start is None else args.start,
+                                args.seconds, args.rate)
+        note = ""
+    else:
+        clock = Clock()
+        with FileSink(args.stream, flush=args.flush, clock=clock) as sink:
+            lines, size, late = asyncio.run(stream_log(generator, sink, args.seconds, args.rate, clock))
+        note = f", at most {late:.3f}s behind"
+    elapsed = max(time.perf_counter() - begin, 1e-9)
+    print(f"Wrote {lines} lines ({size / 1048576:.1f} MB) in {elapsed:.2f}s: {lines / elapsed:.0f} lines/s{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Sidecar index of the byte offset where every minute of an EQ log starts
+#
+# EQ only ever appends to a log and every line starts with its timestamp so the offset of the first
+# line of each minute is enough to seek close to any time without reading what comes before it. The
+# index is written next to the log as <log>.idx (little endian):
+#
+#   header   magic, version, bytes of the log indexed, hashes of the first and the last 4k indexed
+#            and the number of entries
+#   entries  (minute, offset) pairs in file order. minutes are whole minutes since 1970 of the
+#            local timestamps
+#
+# When the log is bigger than the index and the hashed blocks still match, the log has only grown and
+# just the new lines are scanned. Anything else rebuilds the index.
+#
+#   python logindex.py eqlog_Name_server.txt [--find "Thu Feb 15 23:10:29 2024"]
+
+from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_right
+import argparse
+import hashlib
+import os
+import struct
+import time
+
+from logtime import EPOCH, PREFIX_LENGTH, TimestampCodec
+
+MAGIC = b"EQTI"
+VERSION = 1
+HEADER = struct.Struct("<4sHQ16s16sI")
+ENTRY = struct.Struct("<qQ")
+HASH_BLOCK = 4096
+READ_SIZE = 1 << 20
+
+
+def get_index_file(log_file):
+    return log_file + ".idx"
+
+
+def hash_block(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def read_hashes(log, size):
+    # hashes of the first and the last HASH_BLOCK bytes before size
+    log.seek(0)
+    head = hash_block(log.read(min(size, HASH_BLOCK)))
+    log.seek(max(size - HASH_BLOCK, 0))
+    tail = hash_block(log.read(min(size, HASH_BLOCK)))
+    return head, tail
+
+
+def parse_time(text):
+    # "Thu Feb 15 23:10:29 2024", the same in brackets or ISO like "2024-02-15 23:10"
+    text = text.strip().strip("[]")
+    date = TimestampCodec().parse(text)
+    if date is None:
+        try:
+            date = datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(f"{text} is not a time like Thu Feb 15 23:10:29 2024 or 2024-02-15 23:10") from None
+    return date
+
+
+def to_minute(date):
+    return (date - EPOCH) // timedelta(minutes=1)
+
+
+class LogIndex:
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.size = 0
+        self.head = b""
+        self.tail = b""
+        self.minutes = array("q")
+        self.offsets = array("Q")
+
+    @classmethod
+    def load(cls, log_file, index_file=None):
+        index = cls(log_file)
+        with open(index_file or get_index_file(log_file), "rb") as data:
+            magic, version, index.size, index.head, index.tail, count = HEADER.unpack(data.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{index_file or get_index_file(log_file)} is not a version {VERSION} log index")
+            for minute, offset in ENTRY.iter_unpack(data.read(count * ENTRY.size)):
+                index.minutes.append(minute)
+                index.offsets.append(offset)
+        return index
+
+    def save(self, index_file=None):
+        index_file = index_file or get_index_file(self.log_file)
+        # written to a temporary file first so a reader never sees half an index
+        with open(index_file + ".tmp", "wb") as output:
+            output.write(HEADER.pack(MAGIC, VERSION, self.size, self.head, self.tail, len(self.minutes)))
+            for minute, offset in zip(self.minutes, self.offsets):
+                output.write(ENTRY.pack(minute, offset))
+        os.replace(index_file + ".tmp", index_file)
+
+    # True when the log still starts with what was indexed
+    def is_prefix_of(self, log, size):
+        return size >= self.size and read_hashes(log, self.size) == (self.head, self.tail)
+
+    # index the lines after self.size, returns how many bytes were scanned
+    def scan(self, log, size):
+        codec = TimestampCodec()
+        last_minute = self.minutes[-1] if self.minutes else None
+        last_prefix = None
+        offset = self.size
+        log.seek(offset)
+        pending = b""
+
+        while offset + len(pending) < size:
+            data = log.read(min(READ_SIZE, size - offset - len(pending)))
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            # the last piece has no newline yet and is only indexed once it is complete
+            pending = lines.pop()
+            for line in lines:
+                # only the minute matters so most lines are skipped by comparing their first bytes
+                prefix = line[1:17]
+                if prefix != last_prefix:
+                    last_prefix = prefix
+                    date = codec.parse(line[1:PREFIX_LENGTH + 1].decode("latin-1"))
+                    if date is not None:
+                        minute = to_minute(date)
+                        # a clock that went backwards keeps the entries in order
+                        if last_minute is None or minute > last_minute:
+                            self.minutes.append(minute)
+                            self.offsets.append(offset)
+                            last_minute = minute
+                offset += len(line) + 1
+
+        scanned = offset - self.size
+        self.size = offset
+        self.head, self.tail = read_hashes(log, self.size)
+        return scanned
+
+    # offset of the first line of the minute holding date or the closest minute before it
+    def find(self, date):
+        position = bisect_right(self.minutes, to_minute(date)) - 1
+        return self.offsets[position] if position >= 0 else 0
+
+    # offset of the first line of a minute after date, None when the index ends before that
+    def find_after(self, date):
+        position = bisect_right(self.minutes, to_minute(date))
+        return self.offsets[position] if position < len(self.minutes) else None
+
+
+def update_index(log_file, save=True):
+    # loads the sidecar and brings it up to date with the log, returns (index, bytes scanned)
+    try:
+        index = LogIndex.load(log_file)
+    except (OSError, ValueError, struct.error):
+        index = None
+
+    with open(log_file, "rb") as log:
+        size = os.fstat(log.fileno()).st_size
+        if index is None or not index.is_prefix_of(log, size):
+            index = LogIndex(log_file)
+        scanned = index.scan(log, size) if size > index.size else 0
+
+    if save and scanned:
+        index.save()
+    return index, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the minute index of EQ logs")
+    parser.add_argument("logs", nargs="+", help="logs to index")
+    parser.add_argument("--find", metavar="TIME", type=parse_time, help="print the offset to start reading TIME from")
+    args = parser.parse_args()
+
+    for log_file in args.logs:
+        begin = time.perf_counter()
+        index, scanned = update_index(log_file)
+        elapsed = time.perf_counter() - begin
+        print(f"{log_file}: {len(index.minutes)} minutes, scanned {scanned / 1048576:.1f} MB in {elapsed:.3f}s")
+        if args.find:
+            print(f"  lines from {args.find} on start at or after byte {index.find(args.find)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# Profiles the load a set of EQ logs puts on the real time parser
+#
+#   python logprofile.py eqlog_*.txt [--interval 3600] [--top 10] [--json profile.json]
+#
+# Every payload (the line after its 26 character timestamp) is classified as melee, spell damage, DoT,
+# heal, cast, chat, lands on, death or other and counted per second of each log. The report has the
+# lines/sec percentiles and peak of every log, the category mix of the corpus per --interval and the
+# busiest single seconds. Lands on messages come from the spell data createdata.py writes, without it
+# they count as other. loggen.py --mix and --rate can then be set to what the logs really look like.
+#
+# Plain logs are cut into newline aligned byte ranges scanned by a process pool, gzip and zstd logs
+# are read by a single worker each since they can't be split.
+
+from collections import defaultdict
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import re
+import time
+
+from logfights import get_ranges
+from logsim import get_compression, read_lines
+from logtime import EPOCH, TIMESTAMP_FORMAT, TimestampCodec
+
+CATEGORIES = ["melee", "spell", "dot", "heal", "cast", "chat", "landson", "death", "other"]
+CHAT = re.compile(r"[^']*? (?:say|says|tell|tells|told|shout|shouts|auction|auctions)\b[^']*'|[\w.`]+ -> [\w.`]+:")
+CAST = re.compile(r".*? begins? (?:to cast|casting|singing) ")
+MELEE, SPELL, DOT, HEAL, CAST_INDEX, CHAT_INDEX, LANDSON, DEATH, OTHER = range(len(CATEGORIES))
+SPELLS_FILE = "output.txt"
+# plain logs are read in ranges of about this many bytes
+CHUNK_SIZE = 32 << 20
+
+# lands on other messages of the spell data, loaded once in each worker
+lands_on = set()
+
+
+def load_lands_on(spells_file):
+    lands_on.clear()
+    if spells_file and os.path.isfile(spells_file):
+        with open(spells_file, "r") as spells:
+            for line in spells:
+                fields = line.rstrip("\n").split("^")
+                if len(fields) > 18 and fields[18].startswith(" "):
+                    lands_on.add(fields[18])
+
+
+def classify(payload):
+    # substring tests first since most lines are combat and regexes over every line are too slow for a
+    # month of logs. chat comes first so quoted damage is still chat
+    if ("'" in payload or " -> " in payload) and CHAT.match(payload):
+        return CHAT_INDEX
+    if " damage" in payload:
+        if " has taken " in payload:
+            return SPELL if " has taken an extra " in payload else DOT
+        if " damage by " in payload or "non-melee damage" in payload:
+            return SPELL
+        if " points of damage" in payload:
+            return MELEE
+    if " slain" in payload:
+        return DEATH
+    if " tries to " in payload and ", but " in payload:
+        return MELEE
+    if "healed " in payload:
+        return HEAL
+    if " begin" in payload and CAST.match(payload):
+        return CAST_INDEX
+    # "Name is infused for destruction." the message follows a name that can have spaces in it
+    position = payload.find(" ")
+    while position > 0:
+        if payload[position:] in lands_on:
+            return LANDSON
+        position = payload.find(" ", position + 1)
+    return OTHER
+
+
+def count_lines(lines):
+    # { epoch second: [count of each category] }
+    seconds = {}
+    codec = TimestampCodec()
+    last_prefix = None
+    counts = None
+    for line in lines:
+        prefix = line[1:25]
+        if prefix != last_prefix:
+            second = codec.to_epoch(prefix)
+            if second is None:
+                continue
+            last_prefix = prefix
+            counts = seconds.get(second)
+            if counts is None:
+                counts = seconds[second] = [0] * len(CATEGORIES)
+        # the payload after the space following the timestamp
+        counts[classify(line[27:].rstrip("\r\n"))] += 1
+    return seconds
+
+
+def scan_range(log_file, start, end):
+    with open(log_file, "rb") as log:
+        log.seek(start)
+        # latin-1 keeps every byte so nothing is lost to bad UTF-8 in chat
+        text = log.read(end - start).decode("latin-1")
+    return log_file, count_lines(text.splitlines())
+
+
+def scan_compressed(log_file):
+    # latin-1 like scan_range
+    return log_file, count_lines(read_lines(log_file, encoding="latin-1"))
+
+
+def profile_logs(log_files, workers=None, spells_file=SPELLS_FILE):
+    # { log: { epoch second: [count of each category] } }
+    workers = workers or os.cpu_count() or 1
+    tasks = []
+    for log_file in log_files:
+        if get_compression(log_file):
+            tasks.append((scan_compressed, (log_file,)))
+        else:
+            count = max(workers * 4 if workers > 1 else 1, -(-os.path.getsize(log_file) // CHUNK_SIZE))
+            tasks += [(scan_range, (log_file, start, end)) for start, end in get_ranges(log_file, count)]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(workers, initializer=load_lands_on, initargs=(spells_file,)) as pool:
+            results = [future.result() for future in [pool.submit(func, *args) for func, args in tasks]]
+    else:
+        load_lands_on(spells_file)
+        results = [func(*args) for func, args in tasks]
+
+    logs = {log_file: {} for log_file in log_files}
+    for log_file, seconds in results:
+        merged = logs[log_file]
+        for second, counts in seconds.items():
+            # a second can be split between two ranges
+            if second in merged:
+                merged[second] = [a + b for a, b in zip(merged[second], counts)]
+            else:
+                merged[second] = counts
+    return logs
+
+
+def percentile(values, fraction):
+    return values[min(int(fraction * len(values)), len(values) - 1)] if values else 0
+
+
+def format_second(second):
+    # seconds come from TimestampCodec.to_epoch so they are the log's local time and not UTC
+    return (EPOCH + timedelta(seconds=second)).strftime(TIMESTAMP_FORMAT)
+
+
+def get_mix(counts):
+    total = sum(counts) or 1
+    return {name: count / total for name, count in zip(CATEGORIES, counts) if count}
+
+
+def build_report(logs, interval=3600, top=10):
+    totals = [0] * len(CATEGORIES)
+    per_log = {}
+    bursts = []
+    mix = defaultdict(lambda: [0] * len(CATEGORIES))
+
+    for log_file, seconds in logs.items():
+        rates = sorted(sum(counts) for counts in seconds.values())
+        per_log[log_file] = {
+            "lines": sum(rates), "activeSeconds": len(rates), "p50": percentile(rates, 0.5),
+            "p90": percentile(rates, 0.9), "p99": percentile(rates, 0.99), "max": rates[-1] if rates else 0,
+        }
+        for second, counts in seconds.items():
+            bucket = mix[second - second % interval]
+            for i, count in enumerate(counts):
+                totals[i] += count
+                bucket[i] += count
+            bursts.append((sum(counts), second, log_file))
+
+    bursts.sort(reverse=True)
+    return {
+        "lines": sum(totals),
+        "categories": dict(zip(CATEGORIES, totals)),
+        "logs": per_log,
+        "mix": [{"start": format_second(start), "lines": sum(counts), "mix": get_mix(counts)}
+                for start, counts in sorted(mix.items())],
+        "bursts": [{"second": format_second(second), "log": log_file, "lines": lines,
+                    "mix": get_mix(logs[log_file][second])} for lines, second, log_file in bursts[:top]],
+    }
+
+
+def print_report(report, seconds):
+    total = max(report["lines"], 1)
+    print(f"{report['lines']} lines scanned in {seconds:.2f}s ({report['lines'] / max(seconds, 1e-9):.0f} lines/s)")
+    print("  " + "  ".join(f"{name} {count / total:.1%}" for name, count in report["categories"].items() if count))
+
+    print(f"\n{'log':40} {'lines':>10} {'seconds':>8} {'p50/s':>7} {'p90/s':>7} {'p99/s':>7} {'max/s':>7}")
+    for log_file, stats in report["logs"].items():
+        print(f"{log_file[-40:]:40} {stats['lines']:10} {stats['activeSeconds']:8} {stats['p50']:7} {stats['p90']:7} "
+              f"{stats['p99']:7} {stats['max']:7}")
+
+    print(f"\n{'interval':24} {'lines':>10}  " + " ".join(f"{name:>7}" for name in CATEGORIES))
+    for row in report["mix"]:
+        print(f"{row['start']:24} {row['lines']:10}  " + " ".join(f"{row['mix'].get(name, 0):7.1%}" for name in CATEGORIES))
+
+    print(f"\n{'busiest seconds':24} {'lines':>7}  log / mix")
+    for burst in report["bursts"]:
+        mix = ", ".join(f"{name} {share:.0%}" for name, share in sorted(burst["mix"].items(), key=lambda item: -item[1]))
+        print(f"{burst['second']:24} {burst['lines']:7}  {burst['log']}: {mix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the line types and densities of EQ logs")
+    parser.add_argument("logs", nargs="+", help="logs to profile, plain, .gz or .zst")
+    parser.add_argument("--interval", type=int, default=3600,
+                        help="seconds per row of the category mix over time (default 3600)")
+    parser.add_argument("--top", type=int, default=10, help="busiest seconds to list (default 10)")
+    parser.add_argument("--spells", default=SPELLS_FILE,
+                        help=f"spell data from createdata.py for the lands on messages (default {SPELLS_FILE})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes scanning the logs (default one per CPU)")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error("--interval has to be greater than 0")
+
+    begin = time.perf_counter()
+    report = build_report(profile_logs(args.logs, args.workers, args.spells), args.interval, args.top)
+    print_report(report, time.perf_counter() - begin)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,346 @@
-from datetime import datetime, timedelta
-import time
-import threading
+# Replays EQ logs into new files in real time with the timestamps rewritten to the current time
+#
+#   python logsim.py SOURCE DESTINATION [SOURCE DESTINATION ...]
+#   python logsim.py --manifest raid.txt
+#
+# where the manifest has one source=destination pair per line. Every log is replayed by the same
+# asyncio event loop against one monotonic clock so lines from different characters with the same
+# timestamp are written together. --speed compresses the replay (and the new timestamps) by a factor
+# and --fast writes everything without waiting, keeping the timestamps --speed would give.
+#
+# Each destination stays open and a group of lines with the same timestamp goes out in one write.
+# --flush picks when the data is flushed (see logsink.py), --fsync syncs it to disk and --rate caps
+# the bytes per second written to each destination.
+#
+# Groups are scheduled against the start of the replay rather than the previous group so waiting
+# late once does not push back everything after it. How late each group was written compared to its
+# scheduled time is recorded and summarized when the replay ends, --lateness also writes every group.
+#
+# --from and --to replay part of a log. The minute index from logindex.py is used to seek straight to
+# --from instead of reading the log from the start.
+#
+# Sources compressed with gzip or zstd (zstandard package) are found by their first bytes and
+# decompressed as they are read. They can't be seeked, so --from reads them from the start.
+
+from array import array
+from itertools import chain
+import argparse
+import asyncio
+import gzip
+import io
+import locale
+import mmap
+import os
+
+from logindex import parse_time, update_index
+from logsink import FLUSH_POLICIES, FileSink, parse_size
+from logtime import Clock, TimestampCodec
+
+codec = TimestampCodec()
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+READ_SIZE = 1 << 20
+# upper bounds in seconds of the lateness histogram
+LATENESS_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
 
 
 def parse_date_from_line(line):
+    # Assuming the date format is "[Thu Feb 15 23:10:29 2024]"
+    return codec.parse_line(line)
+
+
+def get_compression(source_file):
+    # "gzip" or "zstd" going by the first bytes of the file, None for plain text
+    with open(source_file, "rb") as src:
+        magic = src.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def open_compressed(raw, compression):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
     try:
-        # Assuming the date format is "[Thu Feb 15 23:10:29 2024]"
-        return datetime.strptime(line[1:25], "%a %b %d %H:%M:%S %Y")
-    except ValueError:
-        return None
+        import zstandard
+    except ImportError:
+        raise ValueError("reading .zst logs requires the zstandard package (pip install zstandard)") from None
+    # archives can hold several frames when logs were compressed in pieces
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_SIZE, read_across_frames=True)
 
 
-def simulate_real_time_processing(source_file, destination_file):
-    with open(source_file, "r") as src:
-        all_lines = src.readlines()
+def read_lines(source_file, use_mmap=False, offset=0, encoding=None):
+    # offset is a byte position at the start of a line, like the ones in the logindex sidecar. gzip and
+    # zstd logs are decompressed while they are read so only a buffer of them is in memory at a time.
+    # encoding defaults to the one open() would use
+    encoding = encoding or locale.getpreferredencoding(False)
+    compression = get_compression(source_file)
+    if compression:
+        if offset:
+            raise ValueError(f"{source_file} is compressed and can only be read from the start")
+        with open(source_file, "rb") as raw, open_compressed(raw, compression) as data:
+            with io.TextIOWrapper(data, encoding=encoding) as src:
+                yield from src
+        return
 
-    if not all_lines:
+    if use_mmap:
+        yield from read_lines_mmap(source_file, offset, encoding)
         return
 
-    first_date = parse_date_from_line(all_lines[0])
-    last_date = parse_date_from_line(all_lines[-1])
+    with open(source_file, "rb") as raw:
+        raw.seek(offset)
+        with io.TextIOWrapper(raw, encoding=encoding) as src:
+            yield from src
+
+
+def read_lines_mmap(source_file, offset=0, encoding=None):
+    # decode the same way open() in text mode would, including \r\n line endings
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(source_file, "rb") as src:
+        if os.fstat(src.fileno()).st_size == 0:
+            return
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            data.seek(offset)
+            for line in iter(data.readline, b""):
+                if line.endswith(b"\r\n"):
+                    line = line[:-2] + b"\n"
+                yield line.decode(encoding)
+
+
+def group_lines(lines):
+    # consecutive lines with the same timestamp, lines without one are skipped
+    group_time = None
+    group = []
+    for line in lines:
+        line_date = parse_date_from_line(line)
+        if line_date:
+            if line_date != group_time and group:
+                yield group, group_time
+                group = []
+            group_time = line_date
+            group.append(line)
+
+    if group:
+        yield group, group_time
+
+
+def select_groups(groups, from_date=None, to_date=None):
+    # groups from from_date through to_date, reading stops at the first group after to_date
+    for group, group_time in groups:
+        if to_date and group_time > to_date:
+            break
+        if not from_date or group_time >= from_date:
+            yield group, group_time
+
+
+class ReplayStats:
+    def __init__(self):
+        self.lines = 0
+        # characters written, the same as bytes for the ASCII text EQ writes
+        self.bytes = 0
+        self.groups = 0
+        self.seconds = 0.0
+        self.log_seconds = 0.0
+        # when each group was due and when it was written, in seconds since the replay started
+        self.scheduled = array("d")
+        self.written = array("d")
+
+    def record(self, scheduled, written):
+        self.scheduled.append(scheduled)
+        self.written.append(written)
+
+    def get_lateness(self):
+        return sorted(max(written - scheduled, 0.0) for scheduled, written in zip(self.scheduled, self.written))
 
-    if first_date and last_date:
-        start_time = first_date
-        current_time = datetime.now()
+    def report(self):
+        seconds = max(self.seconds, 1e-9)
+        text = (f"Replayed {self.lines} lines ({self.bytes / 1048576:.1f} MB) covering "
+                f"{self.log_seconds:.0f}s of logs in {self.seconds:.2f}s: "
+                f"{self.lines / seconds:.0f} lines/s, {self.bytes / 1048576 / seconds:.2f} MB/s")
+        if self.scheduled:
+            text += "\n" + self.lateness_report()
+        return text
 
-        groups = []
-        current_group = []
+    def lateness_report(self):
+        lateness = self.get_lateness()
 
-        for line in all_lines:
-            line_date = parse_date_from_line(line)
-            if line_date:
-                if line_date == start_time or not current_group:
-                    current_group.append(line)
-                else:
-                    # New group
-                    groups.append((current_group, start_time))
-                    current_group = [line]
-                    start_time = line_date
+        def percentile(fraction):
+            return lateness[min(int(fraction * len(lateness)), len(lateness) - 1)] * 1000
 
-        if current_group:
-            groups.append((current_group, start_time))
+        lines = [f"Lateness of {len(lateness)} groups: p50 {percentile(0.5):.2f}ms, p99 {percentile(0.99):.2f}ms, "
+                 f"max {lateness[-1] * 1000:.2f}ms"]
+        low = 0.0
+        index = 0
+        for high in LATENESS_BUCKETS + [float("inf")]:
+            count = 0
+            while index < len(lateness) and lateness[index] < high:
+                count += 1
+                index += 1
+            if count:
+                label = f">= {low * 1000:g}ms" if high == float("inf") else f"{low * 1000:g}-{high * 1000:g}ms"
+                lines.append(f"  {label:>14} {count:8} {'#' * max(1, round(40 * count / len(lateness)))}")
+            low = high
+        return "\n".join(lines)
 
-        # with open(destination_file2, 'a') as dst2:
+    def write_lateness(self, file_name):
+        with open(file_name, "w") as output:
+            output.write("scheduled,written,lateness\n")
+            for scheduled, written in zip(self.scheduled, self.written):
+                output.write(f"{scheduled:.6f},{written:.6f},{written - scheduled:.6f}\n")
+
+
+class Replayer:
+    def __init__(self, speed=1.0, fast=False, clock=None, use_mmap=False, sink_options=None, from_date=None,
+                 to_date=None):
+        if speed <= 0:
+            raise ValueError("speed has to be greater than 0")
+        self.speed = speed
+        self.fast = fast
+        self.clock = clock or Clock()
+        self.use_mmap = use_mmap
+        # FileSink arguments for every destination
+        self.sink_options = sink_options or {}
+        # only replay the lines between these times
+        self.from_date = from_date
+        self.to_date = to_date
+        self.stats = ReplayStats()
+        self.first_date = None
+        self.start = None
+        self.start_wall = None
+
+    async def write_group(self, sink, group, new_timestamp):
+        text = "".join([f"{new_timestamp}{line[26:]}" for line in group])
+        await sink.write(text)
+        self.stats.bytes += len(text)
+        self.stats.lines += len(group)
+        self.stats.groups += 1
+
+    async def replay(self, groups, sink):
         for group, group_time in groups:
-            wait_seconds = (group_time - first_date).total_seconds() - (
-                datetime.now() - current_time
-            ).total_seconds()
-            if wait_seconds > 0:
-                time.sleep(wait_seconds)
-
-            with open(destination_file, "a") as dst:
-                for line in group:
-                    new_timestamp = datetime.now().strftime("[%a %b %d %H:%M:%S %Y]")
-                    dst.write(f"{new_timestamp}{line[26:]}")
-                    dst.flush()
-                    # dst2.write(f"{new_timestamp}{line[26:]}")
-                    # dst2.flush()
-                dst.close()
-
-
-def thread1f():
-    simulate_real_time_processing(
-        "r:/eqlog_Kizant_xegony-picked.txt", "r:/eqlog_Kizant_xegony.txt"
-    )
-
-thread1 = threading.Thread(target=thread1f)
-thread1.start()
-thread1.join()
+            # offset of the group on the compressed virtual clock
+            offset = (group_time - self.first_date).total_seconds() / self.speed
+            if self.fast:
+                # still yield so one log does not hold up the others
+                await asyncio.sleep(0)
+            else:
+                await sink.sleep_until(self.start + offset)
+            await self.write_group(sink, group, codec.format(self.start_wall + offset))
+            if not self.fast:
+                self.stats.record(offset, self.clock.time() - self.start)
+            self.stats.log_seconds = max(self.stats.log_seconds, offset * self.speed)
+
+    async def replay_all(self, pairs):
+        # only the group being written is held in memory so replay starts right away on logs of any size
+        sources = []
+        for source_file, destination_file in pairs:
+            offset = 0
+            if self.from_date and not get_compression(source_file):
+                # seek to the minute before from_date, the index is brought up to date if the log grew
+                index, scanned = update_index(source_file, save=False)
+                if scanned:
+                    try:
+                        index.save()
+                    except OSError:
+                        # logs in a read-only archive are still seeked with the index built in memory
+                        pass
+                offset = index.find(self.from_date)
+            groups = select_groups(group_lines(read_lines(source_file, self.use_mmap, offset)), self.from_date,
+                                   self.to_date)
+            first = next(groups, None)
+            if first:
+                sources.append((chain([first], groups), destination_file, first[1]))
+
+        if not sources:
+            return self.stats
+
+        # the earliest line of any log is written first and every other line keeps its offset from it
+        self.first_date = min(date for groups, destination_file, date in sources)
+        self.start = self.clock.time()
+        self.start_wall = self.clock.wall()
+        sinks = [FileSink(destination_file, clock=self.clock, **self.sink_options)
+                 for groups, destination_file, date in sources]
+        try:
+            await asyncio.gather(*(self.replay(groups, sink) for (groups, destination_file, date), sink
+                                   in zip(sources, sinks)))
+        finally:
+            for sink in sinks:
+                sink.close()
+        self.stats.seconds = self.clock.time() - self.start
+        return self.stats
+
+    def run(self, pairs):
+        return asyncio.run(self.replay_all(pairs))
+
+
+def simulate_real_time_processing(source_file, destination_file, use_mmap=False):
+    Replayer(use_mmap=use_mmap).run([(source_file, destination_file)])
+
+
+def read_manifest(manifest_file):
+    pairs = []
+    with open(manifest_file, "r") as manifest:
+        for number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                if "=" not in line:
+                    raise ValueError(f"{manifest_file} line {number} is not source=destination")
+                source_file, destination_file = line.split("=", 1)
+                pairs.append((source_file.strip(), destination_file.strip()))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay EQ logs in real time with new timestamps")
+    parser.add_argument("files", nargs="*", metavar="SOURCE DESTINATION",
+                        help="source log and the file to replay it into, repeat for more characters")
+    parser.add_argument("--manifest", help="file with a source=destination pair per line")
+    parser.add_argument("--mmap", action="store_true", help="read the source logs through mmap")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay this many times faster than real time (default 1)")
+    parser.add_argument("--fast", action="store_true",
+                        help="write as fast as possible, timestamps still follow --speed")
+    parser.add_argument("--flush", choices=FLUSH_POLICIES, default="group",
+                        help="flush after every group, every --flush-bytes, every --flush-interval or only at "
+                             "the end (default group)")
+    parser.add_argument("--flush-bytes", type=parse_size, default="64k",
+                        help="bytes to collect before flushing with --flush bytes (default 64k)")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="seconds between flushes with --flush interval (default 1)")
+    parser.add_argument("--fsync", action="store_true", help="also sync the destinations to disk on every flush")
+    parser.add_argument("--rate", type=parse_size, default=0,
+                        help="most bytes per second to write to each destination, like 512k (default no limit)")
+    parser.add_argument("--from", dest="from_date", metavar="TIME", type=parse_time,
+                        help="start at this time like \"Thu Feb 15 23:10:29 2024\" or 2024-02-15T23:10, seeking "
+                             "with the <log>.idx sidecar from logindex.py (built when missing)")
+    parser.add_argument("--to", dest="to_date", metavar="TIME", type=parse_time, help="stop after this time")
+    parser.add_argument("--lateness", metavar="FILE",
+                        help="write when every group was scheduled and written, as CSV")
+    args = parser.parse_args()
+
+    if len(args.files) % 2:
+        parser.error("every source log needs a destination")
+    pairs = list(zip(args.files[::2], args.files[1::2]))
+    if args.manifest:
+        pairs += read_manifest(args.manifest)
+    if not pairs:
+        parser.error("no logs to replay")
+
+    for source_file, destination_file in pairs:
+        print(f"Replaying {source_file} into {destination_file}")
+    if args.speed <= 0:
+        parser.error("--speed has to be greater than 0")
+
+    sink_options = {"flush": args.flush, "flush_bytes": args.flush_bytes, "flush_interval": args.flush_interval,
+                    "fsync": args.fsync, "rate": args.rate}
+    replayer = Replayer(speed=args.speed, fast=args.fast, use_mmap=args.mmap, sink_options=sink_options,
+                        from_date=args.from_date, to_date=args.to_date)
+    stats = replayer.run(pairs)
+    print(stats.report())
+    if args.lateness:
+        stats.write_lateness(args.lateness)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Output sinks for the log replay tools
+#
+# FileSink keeps the destination open and writes each group of lines with a single write. When the
+# data reaches the file is set by the flush policy:
+#
+#   group     flush after every group, like EQ writing a burst of lines (default)
+#   bytes     flush once flush_bytes are waiting
+#   interval  flush when flush_interval seconds have passed since the last flush. callers waiting for
+#             their next write sleep through FileSink.sleep_until so it also happens between writes
+#   none      only flush when the buffer is full or the sink is closed
+#
+# fsync=True also syncs the file to disk after each flush and rate=N limits the writes to N bytes per
+# second, for testing parsers against a slow or bursty writer.
+
+import os
+
+from logtime import Clock
+
+FLUSH_POLICIES = ["group", "bytes", "interval", "none"]
+BUFFER_SIZE = 1 << 20
+SIZE_SUFFIXES = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+
+
+def parse_size(text):
+    # "512", "64k" or "10M"
+    text = text.strip().lower()
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(float(text))
+
+
+class RateLimiter:
+    # token bucket allowing up to one second of burst, larger writes wait until they are paid for
+    def __init__(self, rate, clock=None):
+        if rate <= 0:
+            raise ValueError("rate has to be greater than 0")
+        self.rate = rate
+        self.clock = clock or Clock()
+        self.allowance = rate
+        self.last = self.clock.time()
+        self.waited = 0.0
+
+    # sleep_until lets a FileSink keep flushing while the write waits
+    async def acquire(self, size, sleep_until=None):
+        now = self.clock.time()
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+        self.last = now
+        self.allowance -= size
+        if self.allowance < 0:
+            wait = -self.allowance / self.rate
+            self.waited += wait
+            await (sleep_until or self.clock.sleep_until)(now + wait)
+
+
+class FileSink:
+    def __init__(self, file_name, flush="group", flush_bytes=1 << 16, flush_interval=1.0, fsync=False, rate=None,
+                 clock=None):
+        if flush not in FLUSH_POLICIES:
+            raise ValueError(f"unknown flush policy {flush}")
+        self.file_name = file_name
+        self.flush_policy = flush
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.clock = clock or Clock()
+        self.limiter = RateLimiter(rate, self.clock) if rate else None
+        self.file = open(file_name, "a", buffering=BUFFER_SIZE)
+        self.pending = 0
+        self.last_flush = self.clock.time()
+        self.writes = 0
+        self.flushes = 0
+
+    async def write(self, text):
+        if self.limiter:
+            await self.limiter.acquire(len(text), self.sleep_until)
+        self.write_now(text)
+
+    # write without rate limiting, for callers outside of an event loop
+    def write_now(self, text):
+        self.file.write(text)
+        self.writes += 1
+        self.pending += len(text)
+
+        if self.flush_policy == "group":
+            self.flush()
+        elif self.flush_policy == "bytes":
+            if self.pending >= self.flush_bytes:
+                self.flush()
+        elif self.flush_policy == "interval":
+            if self.clock.time() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    # when the pending bytes have to be flushed by, None when nothing is waiting on the clock
+    def get_flush_due(self):
+        if self.flush_policy == "interval" and self.pending:
+            return self.last_flush + self.flush_interval
+        return None
+
+    # sleeps until due like Clock.sleep_until but wakes up to flush when the interval runs out first,
+    # so with nothing new to write the pending bytes still reach the file in time
+    async def sleep_until(self, due):
+        flush_due = self.get_flush_due()
+        while flush_due is not None and flush_due < due:
+            await self.clock.sleep_until(flush_due)
+            self.flush()
+            flush_due = self.get_flush_due()
+        await self.clock.sleep_until(due)
+
+    def flush(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_flush = self.clock.time()
+        self.flushes += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,196 @@
+# Cached parsing and formatting of EQ log timestamps like "[Thu Feb 15 23:10:29 2024]"
+#
+# Hundreds of log lines share the same second, so parsed prefixes and formatted seconds are memoized.
+# Cache misses use a manual field parser and only fall back to strptime for unusual input. Clock and
+# ManualClock are the time sources the replay tools schedule against.
+#
+#   python logtime.py --bench [LINES]
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+TIMESTAMP_FORMAT = "%a %b %d %H:%M:%S %Y"
+PREFIX_LENGTH = 24
+MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+DAYS = {"Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"}
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_fields(prefix):
+    # "Thu Feb 15 23:10:29 2024" by position, None when it does not look like a timestamp
+    if len(prefix) != PREFIX_LENGTH or prefix[3] != " " or prefix[7] != " " or prefix[10] != " ":
+        return None
+    if prefix[13] != ":" or prefix[16] != ":" or prefix[19] != " " or prefix[:3] not in DAYS:
+        return None
+    month = MONTHS.get(prefix[4:7])
+    if month is None:
+        return None
+    try:
+        return datetime(int(prefix[20:24]), month, int(prefix[8:10]), int(prefix[11:13]),
+                        int(prefix[14:16]), int(prefix[17:19]))
+    except ValueError:
+        return None
+
+
+class TimestampCodec:
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.parsed = {}
+        self.formatted = {}
+        # (key, value) of the last lookups, kept as one tuple so threads sharing a codec see a matching pair
+        self.last_parsed = (None, None)
+        self.last_formatted = (None, None)
+
+    # datetime of a 24 character prefix or None
+    def parse(self, prefix):
+        last_prefix, last_date = self.last_parsed
+        if prefix == last_prefix:
+            return last_date
+
+        date = self.parsed.get(prefix, False)
+        if date is False:
+            date = parse_fields(prefix)
+            if date is None:
+                try:
+                    date = datetime.strptime(prefix, TIMESTAMP_FORMAT)
+                except ValueError:
+                    date = None
+            # logs move forward in time so old entries are rarely needed again
+            if len(self.parsed) >= self.max_entries:
+                self.parsed.clear()
+            self.parsed[prefix] = date
+
+        self.last_parsed = (prefix, date)
+        return date
+
+    def parse_line(self, line):
+        return self.parse(line[1:25])
+
+    # whole seconds of the (local, naive) timestamp since 1970 or None
+    def to_epoch(self, prefix):
+        date = self.parse(prefix)
+        return None if date is None else (date - EPOCH) // timedelta(seconds=1)
+
+    # bracketed timestamp of an epoch second, e.g. from time.time(), in local time
+    def format(self, seconds):
+        second = int(seconds)
+        last_second, last_text = self.last_formatted
+        if second == last_second:
+            return last_text
+
+        text = self.formatted.get(second)
+        if text is None:
+            text = time.strftime("[" + TIMESTAMP_FORMAT + "]", time.localtime(second))
+            if len(self.formatted) >= self.max_entries:
+                self.formatted.clear()
+            self.formatted[second] = text
+
+        self.last_formatted = (second, text)
+        return text
+
+    def format_now(self):
+        return self.format(time.time())
+
+
+class Clock:
+    # monotonic time to schedule against and wall time for the new timestamps
+    def time(self):
+        return time.monotonic()
+
+    def wall(self):
+        return time.time()
+
+    async def sleep_until(self, due):
+        # always yields to the other tasks, and the event loop can wake up a little early so sleep again
+        # for whatever is left
+        remaining = due - self.time()
+        while True:
+            await asyncio.sleep(max(remaining, 0))
+            remaining = due - self.time()
+            if remaining <= 0:
+                break
+
+
+class ManualClock(Clock):
+    # clock for tests that never sleeps, waiting moves it straight to the due time
+    def __init__(self, wall=0.0):
+        self.now = 0.0
+        self.start_wall = wall
+
+    def time(self):
+        return self.now
+
+    def wall(self):
+        return self.start_wall + self.now
+
+    async def sleep_until(self, due):
+        self.now = max(self.now, due)
+        await asyncio.sleep(0)
+
+
+def run_benchmark(count):
+    start = datetime(2024, 2, 15, 23, 10, 29)
+    lines = []
+    for i in range(count):
+        # about 200 lines per second like a busy raid
+        stamp = (start + timedelta(seconds=i // 200)).strftime(TIMESTAMP_FORMAT)
+        lines.append(f"[{stamp}] You hit a goblin for {i} points of damage.\n")
+
+    def strptime_parse():
+        for line in lines:
+            datetime.strptime(line[1:25], TIMESTAMP_FORMAT)
+
+    def codec_parse():
+        codec = TimestampCodec()
+        for line in lines:
+            codec.parse_line(line)
+
+    def manual_parse():
+        for line in lines:
+            parse_fields(line[1:25])
+
+    def strftime_format():
+        for line in lines:
+            datetime.now().strftime("[" + TIMESTAMP_FORMAT + "]")
+
+    def codec_format():
+        codec = TimestampCodec()
+        for line in lines:
+            codec.format_now()
+
+    codec = TimestampCodec()
+    for line in lines[:1000]:
+        assert codec.parse_line(line) == datetime.strptime(line[1:25], TIMESTAMP_FORMAT)
+
+    print(f"{count} lines")
+    for name, func in (
+        ("parse strptime", strptime_parse),
+        ("parse manual", manual_parse),
+        ("parse codec", codec_parse),
+        ("format strftime", strftime_format),
+        ("format codec", codec_format),
+    ):
+        begin = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - begin
+        print(f"{name:16} {elapsed:8.3f}s {count / elapsed:12.0f} lines/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EQ log timestamp codec")
+    parser.add_argument("--bench", type=int, nargs="?", const=500000, metavar="LINES",
+                        help="compare the codec with strptime/strftime (default 500000 lines)")
+    args = parser.parse_args()
+    if args.bench:
+        run_benchmark(args.bench)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Loads the SPA rules in sparules.txt and compiles them into lists indexed by SPA
+#
+# createdata.py classifies every slot of every spell so the ADPS bits, base1 limits and the
+# beneficial/detrimental variants are looked up by SPA instead of searching the SPA lists. Run it to
+# print the compiled tables.
+
+import os.path
+import sys
+
+SpaRulesFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sparules.txt')
+ADPS_SECTIONS = [ 'Caster', 'Melee', 'Tank', 'Healer' ]
+LIST_SECTIONS = ADPS_SECTIONS + [ 'BeneficialDetrimental' ]
+VALUE_SECTIONS = [ 'Base1Min', 'Base1Max', 'ExtendedDuration', 'MaxHits' ]
+NO_LIMIT = 1 << 63
+
+# returns { section: [values] } for the list sections and { section: { key: value } } for the others
+def loadRules(fileName):
+  rules = { section: [] for section in LIST_SECTIONS }
+  rules.update({ section: dict() for section in VALUE_SECTIONS })
+  section = None
+
+  with open(fileName, 'r') as data:
+    for number, line in enumerate(data.read().splitlines(), 1):
+      line = line.split('//', 1)[0].strip()
+      if not line:
+        continue
+
+      try:
+        if line[0] == '#':
+          section = line[1:]
+          if section not in rules:
+            raise ValueError('unknown section %s' % section)
+        elif section in LIST_SECTIONS:
+          for value in line.split(','):
+            if value.strip() and int(value) not in rules[section]:
+              rules[section].append(int(value))
+        elif section in VALUE_SECTIONS:
+          key, value = line.split('=')
+          rules[section][int(key)] = int(value)
+        else:
+          raise ValueError('%s is not in a section' % line)
+      except ValueError as error:
+        raise ValueError('%s line %d: %s' % (fileName, number, error)) from None
+  return rules
+
+class SpaRules:
+  def __init__(self, rules, adpsValues):
+    self.rules = rules
+    spas = [spa for section in ADPS_SECTIONS for spa in rules[section]]
+    self.size = max(spas, default=-1) + 1
+
+    # ADPS bits of each SPA when SPA 138 is not used (any), is 0 (detrimental) or is not 0 (beneficial)
+    self.adps = [0] * self.size
+    self.detrimental = [0] * self.size
+    self.beneficial = [0] * self.size
+    for section in ADPS_SECTIONS:
+      value = adpsValues[section]
+      for spa in rules[section]:
+        self.adps[spa] |= value
+        if spa not in rules['BeneficialDetrimental'] or section not in ('Caster', 'Healer'):
+          self.detrimental[spa] |= value
+          self.beneficial[spa] |= value
+        elif section == 'Caster':
+          self.detrimental[spa] |= value
+        else:
+          self.beneficial[spa] |= value
+
+    # base1 has to be >= minBase1 and < maxBase1
+    self.minBase1 = [0] * self.size
+    self.maxBase1 = [NO_LIMIT] * self.size
+    for spa, value in rules['Base1Max'].items():
+      if spa < self.size:
+        self.minBase1[spa] = -NO_LIMIT
+        self.maxBase1[spa] = value
+    for spa, value in rules['Base1Min'].items():
+      if spa < self.size:
+        self.minBase1[spa] = value
+        self.maxBase1[spa] = NO_LIMIT
+
+  @classmethod
+  def load(cls, fileName, adpsValues):
+    return cls(loadRules(fileName), adpsValues)
+
+def main():
+  fileName = sys.argv[1] if len(sys.argv) > 1 else SpaRulesFile
+  rules = SpaRules.load(fileName, { section: 1 << i for i, section in enumerate(ADPS_SECTIONS) })
+  print('%-5s %-28s %-28s %s' % ('SPA', 'ADPS', 'base1', 'SPA 138 det/ben'))
+  for spa in range(rules.size):
+    if rules.adps[spa]:
+      names = lambda bits: ','.join(section for i, section in enumerate(ADPS_SECTIONS) if bits & (1 << i)) or '-'
+      low = rules.minBase1[spa]
+      high = rules.maxBase1[spa]
+      limit = '>= %d' % low if high == NO_LIMIT else '< %d' % high if low == -NO_LIMIT else '%d..%d' % (low, high)
+      split = '' if rules.detrimental[spa] == rules.beneficial[spa] else '%s / %s' % (names(rules.detrimental[spa]),
+                                                                                      names(rules.beneficial[spa]))
+      print('%-5d %-28s %-28s %s' % (spa, names(rules.adps[spa]), limit, split))
+  print('%d ExtendedDuration and %d MaxHits focus bonuses' % (len(rules.rules['ExtendedDuration']),
+                                                                len(rules.rules['MaxHits'])))
+
+if __name__ == '__main__':
+  main()
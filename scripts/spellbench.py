@@ -0,0 +1,201 @@
+# Benchmarks createdata.py on synthetic spell files from spellgen.py
+#
+# Each scale is generated once into <dir>/<scale>x and every parse mode runs in its own process so
+# memory use is not shared between runs. For each phase the wall time, rows/sec and peak RSS of the
+# process when the phase finished are reported. Save a run with --save and pass it to --compare on a
+# later run to flag phases that got slower. --memory compares the memory used by the parsed spells
+# as SpellInfo records against the dict per spell they replaced.
+#
+#   python spellbench.py --scale 1 10 50 --mode row columnar workers
+
+import argparse
+import json
+import os.path
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import createdata
+import spellgen
+
+MODES = [ 'row', 'columnar', 'workers' ]
+
+# peak resident set size of this process in MB or None when it can't be read
+def getPeakRss():
+  try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+  except ImportError:
+    pass
+  try:
+    import psutil
+    return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+  except (ImportError, AttributeError):
+    return None
+
+def countRows(fileName):
+  with open(fileName, 'rb') as f:
+    return sum(1 for line in f)
+
+# runs every phase of createdata.main on the files in the current directory
+def runPhases(mode, workers):
+  rowCount = countRows(createdata.DBSpellsFile)
+  phases = []
+  state = dict()
+
+  def phase(name, func, rows=rowCount):
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    phases.append({ 'phase': name, 'seconds': seconds, 'rows': rows, 'rowsPerSec': rows / seconds if seconds else 0,
+                    'peakRssMB': getPeakRss() })
+
+  def loadStrings():
+    state['strings'] = createdata.loadStrings(createdata.DBSpellsStrFile)
+
+  def parse():
+    if mode == 'columnar':
+      from spellcolumns import parseSpellColumns
+      state['rows'] = list(parseSpellColumns(createdata.DBSpellsFile))
+    elif mode == 'workers':
+      state['rows'] = list(createdata.parseSpellFileParallel(createdata.DBSpellsFile, workers))
+    else:
+      state['rows'] = list(createdata.parseSpellFile(createdata.DBSpellsFile))
+
+  def merge():
+    state['spells'], state['links'] = createdata.mergeSpells(state.pop('rows'), *state['strings'])
+
+  def propagate():
+    createdata.propagateClassMasks(state['spells'], state['links'])
+
+  def write():
+    output = { id: createdata.formatSpell(sp) for id, sp in state['spells'].items() }
+    createdata.writeOutput(output, createdata.OutputFile)
+
+  def sidecars():
+    from spellsidecars import writeSidecars
+    from spellmessages import writeMessageIndex
+    writeSidecars(createdata.OutputFile)
+    writeMessageIndex(createdata.OutputFile)
+
+  phase('strings', loadStrings, countRows(createdata.DBSpellsStrFile))
+  phase('parse', parse)
+  phase('merge', merge)
+  phase('propagate', propagate, len(state['spells']))
+  phase('write', write, len(state['spells']))
+  phase('sidecars', sidecars, len(state['spells']))
+  return phases
+
+# traced memory of the parsed spells kept as SpellInfo records and as dicts. both share the same
+# field values so only the cost of the records themselves is compared
+def measureRecords():
+  rows = list(createdata.parseSpellFile(createdata.DBSpellsFile))
+  result = { 'spells': len(rows) }
+  for key, build in (('dict', lambda: [info.asDict() for info in rows]), ('slots', lambda: [info.copy() for info in rows])):
+    tracemalloc.start()
+    records = build()
+    result[key] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+  return result
+
+def getFixture(directory, scale, seed):
+  path = os.path.join(directory, '%gx' % scale)
+  spellsFile = os.path.join(path, createdata.DBSpellsFile)
+  if not os.path.isfile(spellsFile):
+    os.makedirs(path, exist_ok=True)
+    print('Generating %d spells in %s' % (int(spellgen.REAL_ROWS * scale), path))
+    spellgen.generate(int(spellgen.REAL_ROWS * scale), spellsFile, os.path.join(path, createdata.DBSpellsStrFile), seed)
+  return path
+
+def runMode(path, mode, workers):
+  command = [sys.executable, os.path.abspath(__file__), '--run', mode, '--workers', str(workers)]
+  result = subprocess.run(command, cwd=path, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+  return json.loads(result.stdout.splitlines()[-1])
+
+def runRecords(path):
+  command = [sys.executable, os.path.abspath(__file__), '--run', 'records']
+  result = subprocess.run(command, cwd=path, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+  return json.loads(result.stdout.splitlines()[-1])
+
+def printRecords(results):
+  print('%-8s %10s %10s %10s %14s %14s' % ('scale', 'spells', 'dict MB', 'slots MB', 'dict B/spell', 'slots B/spell'))
+  for scale, result in results.items():
+    count = max(result['spells'], 1)
+    print('%-8s %10d %10.1f %10.1f %14.0f %14.0f' % (scale, result['spells'], result['dict'] / 1048576,
+                                                     result['slots'] / 1048576, result['dict'] / count,
+                                                     result['slots'] / count))
+
+def printResults(results, baseline, threshold):
+  slower = []
+  print('%-8s %-9s %-10s %10s %12s %10s' % ('scale', 'mode', 'phase', 'seconds', 'rows/sec', 'peak MB'))
+  for key, phases in results.items():
+    scale, mode = key.split('/')
+    total = 0
+    for phase in phases:
+      total += phase['seconds']
+      rss = '%.0f' % phase['peakRssMB'] if phase['peakRssMB'] is not None else '-'
+      note = ''
+      previous = { p['phase']: p for p in baseline.get(key, []) }.get(phase['phase'])
+      if previous and previous['seconds'] > 0:
+        change = phase['seconds'] / previous['seconds'] - 1
+        note = ' %+.0f%%' % (change * 100)
+        # ignore noise on phases that only take a few milliseconds
+        if change > threshold and phase['seconds'] - previous['seconds'] > 0.05:
+          slower.append('%s %s %s' % (key, phase['phase'], note.strip()))
+          note += ' SLOWER'
+      print('%-8s %-9s %-10s %10.3f %12.0f %10s%s' % (scale, mode, phase['phase'], phase['seconds'], phase['rowsPerSec'],
+                                                     rss, note))
+    print('%-8s %-9s %-10s %10.3f' % (scale, mode, 'total', total))
+  return slower
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark createdata.py on generated spell files')
+  parser.add_argument('--scale', type=float, nargs='+', default=[1, 10, 50],
+                      help='row counts as multiples of %d (default 1 10 50)' % spellgen.REAL_ROWS)
+  parser.add_argument('--mode', nargs='+', choices=MODES, default=['row'], help='parse modes to run (default row)')
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes for the workers mode')
+  parser.add_argument('--dir', default='bench', help='where to generate the spell files (default bench)')
+  parser.add_argument('--seed', type=int, default=1, help='random seed for the spell files (default 1)')
+  parser.add_argument('--save', metavar='FILE', help='write the results as JSON')
+  parser.add_argument('--compare', metavar='FILE', help='compare with results saved by --save')
+  parser.add_argument('--threshold', type=float, default=0.2,
+                      help='fraction a phase can slow down before --compare fails (default 0.2)')
+  parser.add_argument('--memory', action='store_true', help='compare the memory used by spell records and dicts')
+  parser.add_argument('--run', choices=MODES + ['records'], help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  # child process running a single mode in the fixture directory
+  if args.run == 'records':
+    print(json.dumps(measureRecords()))
+    return
+  if args.run:
+    print(json.dumps(runPhases(args.run, args.workers)))
+    return
+
+  if args.memory:
+    printRecords({ '%gx' % scale: runRecords(getFixture(args.dir, scale, args.seed)) for scale in args.scale })
+    return
+
+  results = dict()
+  for scale in args.scale:
+    path = getFixture(args.dir, scale, args.seed)
+    for mode in args.mode:
+      print('Running %s mode on %gx' % (mode, scale))
+      results['%gx/%s' % (scale, mode)] = runMode(path, mode, args.workers)
+
+  baseline = json.load(open(args.compare, 'r')) if args.compare else dict()
+  slower = printResults(results, baseline, args.threshold)
+
+  if args.save:
+    with open(args.save, 'w') as output:
+      json.dump(results, output, indent=2)
+
+  if slower:
+    print('%d phases are more than %.0f%% slower than %s' % (len(slower), args.threshold * 100, args.compare))
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
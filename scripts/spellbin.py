@@ -0,0 +1,194 @@
+# Compact binary version of the spell data written by createdata.py
+#
+# Layout (little endian):
+#   header        magic, version, record count, string count, record struct format and section offsets
+#   records       one fixed width record per spell in the same order as the text file. numeric columns
+#                 use the smallest integer type that fits every value and strings are string table indexes
+#   index         (id, record number) pairs sorted by id
+#   string table  offsets followed by the UTF-8 data of every distinct name and message
+#
+# SpellDb memory maps the file and only decodes the records and strings that are asked for. Run with a
+# binary file and the text file it was built from to check that every record round trips.
+
+import argparse
+import mmap
+import struct
+import sys
+
+from createdata import OUTPUT_FIELDS, OutputFile
+
+BinaryFile = 'output.bin'
+MAGIC = b'EQSB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII32sQQQQ')
+INDEX = struct.Struct('<iI')
+OFFSET = struct.Struct('<I')
+STRING_FIELDS = [ 'name', 'landsOnYou', 'landsOnOther', 'wearOff' ]
+INT_TYPES = [ ('B', 0, 0xff), ('H', 0, 0xffff), ('I', 0, 0xffffffff), ('b', -0x80, 0x7f), ('h', -0x8000, 0x7fff),
+              ('i', -0x80000000, 0x7fffffff), ('q', -0x8000000000000000, 0x7fffffffffffffff) ]
+
+def getIntType(values):
+  low = min(values, default=0)
+  high = max(values, default=0)
+  for code, minValue, maxValue in INT_TYPES:
+    if minValue <= low and high <= maxValue:
+      return code
+  raise ValueError('values between %d and %d do not fit in 64 bits' % (low, high))
+
+def writeBinary(textFile, fileName):
+  strings = dict()
+  columns = [[] for field in OUTPUT_FIELDS]
+
+  with open(textFile, 'r') as db:
+    for number, line in enumerate(db.read().splitlines(), 1):
+      data = line.split('^')
+      if len(data) != len(OUTPUT_FIELDS):
+        raise ValueError('%s line %d has %d columns instead of %d' % (textFile, number, len(data), len(OUTPUT_FIELDS)))
+
+      for i, field in enumerate(OUTPUT_FIELDS):
+        if field in STRING_FIELDS:
+          columns[i].append(strings.setdefault(data[i], len(strings)))
+        else:
+          try:
+            columns[i].append(int(data[i]))
+          except ValueError:
+            raise ValueError('%s line %d has %s of %r' % (textFile, number, field, data[i])) from None
+
+  ids = columns[OUTPUT_FIELDS.index('id')]
+  if ids and (min(ids) < -0x80000000 or max(ids) > 0x7fffffff):
+    raise ValueError('spell ids must fit in 32 bits')
+
+  recordFormat = '<' + ''.join(getIntType(column) for column in columns)
+  record = struct.Struct(recordFormat)
+  count = len(ids)
+
+  encoded = [text.encode('utf-8') for text in strings]
+  offsets = [0]
+  for value in encoded:
+    offsets.append(offsets[-1] + len(value))
+
+  recordsOffset = HEADER.size
+  indexOffset = recordsOffset + count * record.size
+  stringOffsetsOffset = indexOffset + count * INDEX.size
+  stringDataOffset = stringOffsetsOffset + len(offsets) * OFFSET.size
+
+  with open(fileName, 'wb') as output:
+    output.write(HEADER.pack(MAGIC, VERSION, 0, count, len(encoded), recordFormat.encode('ascii'), recordsOffset,
+                             indexOffset, stringOffsetsOffset, stringDataOffset))
+    for values in zip(*columns):
+      output.write(record.pack(*values))
+    for id, number in sorted(zip(ids, range(count))):
+      output.write(INDEX.pack(id, number))
+    output.write(struct.pack('<%dI' % len(offsets), *offsets))
+    output.write(b''.join(encoded))
+
+class SpellDb:
+  def __init__(self, fileName):
+    self.file = open(fileName, 'rb')
+    self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, flags, self.count, self.stringCount, recordFormat, self.recordsOffset, self.indexOffset,
+     self.stringOffsetsOffset, self.stringDataOffset) = HEADER.unpack_from(self.data, 0)
+    if magic != MAGIC or version != VERSION:
+      self.close()
+      raise ValueError('%s is not a version %d spell database' % (fileName, VERSION))
+
+    self.record = struct.Struct(recordFormat.rstrip(b'\0').decode('ascii'))
+    self.stringFields = [OUTPUT_FIELDS.index(field) for field in STRING_FIELDS]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def __len__(self):
+    return self.count
+
+  def __iter__(self):
+    for number in range(self.count):
+      yield self.getSpell(number)
+
+  def close(self):
+    self.data.close()
+    self.file.close()
+
+  def getString(self, index):
+    start, end = struct.unpack_from('<II', self.data, self.stringOffsetsOffset + index * OFFSET.size)
+    return self.data[self.stringDataOffset + start:self.stringDataOffset + end].decode('utf-8')
+
+  # raw record values with strings left as string table indexes
+  def getRecord(self, number):
+    if not 0 <= number < self.count:
+      raise IndexError(number)
+    return self.record.unpack_from(self.data, self.recordsOffset + number * self.record.size)
+
+  def getValues(self, number):
+    values = list(self.getRecord(number))
+    for i in self.stringFields:
+      values[i] = self.getString(values[i])
+    return values
+
+  def getSpell(self, number):
+    return dict(zip(OUTPUT_FIELDS, self.getValues(number)))
+
+  def formatSpell(self, number):
+    return '^'.join(str(value) for value in self.getValues(number))
+
+  # binary search of the id index, returns the record number or -1
+  def findRecord(self, id):
+    low = 0
+    high = self.count - 1
+    while low <= high:
+      middle = (low + high) // 2
+      found, number = INDEX.unpack_from(self.data, self.indexOffset + middle * INDEX.size)
+      if found < id:
+        low = middle + 1
+      elif found > id:
+        high = middle - 1
+      else:
+        return number
+    return -1
+
+  def getSpellById(self, id):
+    number = self.findRecord(int(id))
+    return self.getSpell(number) if number >= 0 else None
+
+# compare every record against the text file it was built from
+def verifyBinary(fileName, textFile):
+  problems = []
+  with SpellDb(fileName) as db, open(textFile, 'r') as text:
+    lines = text.read().splitlines()
+    if len(lines) != len(db):
+      problems.append('%s has %d records but %s has %d lines' % (fileName, len(db), textFile, len(lines)))
+
+    for number, line in enumerate(lines[:len(db)]):
+      if db.formatSpell(number) != line:
+        problems.append('record %d is %s instead of %s' % (number, db.formatSpell(number), line))
+      elif db.findRecord(int(line.split('^')[0])) < 0:
+        problems.append('id %s is missing from the index' % line.split('^')[0])
+  return problems
+
+def main():
+  parser = argparse.ArgumentParser(description='Check or read the binary spell data written by createdata.py --binary')
+  parser.add_argument('binary', nargs='?', default=BinaryFile, help='binary spell file (default %s)' % BinaryFile)
+  parser.add_argument('text', nargs='?', default=OutputFile, help='text spell file to compare with (default %s)' % OutputFile)
+  parser.add_argument('--id', action='append', default=[], help='print the spell with this id instead')
+  args = parser.parse_args()
+
+  if args.id:
+    with SpellDb(args.binary) as db:
+      for id in args.id:
+        print(db.getSpellById(id))
+    return
+
+  problems = verifyBinary(args.binary, args.text)
+  for problem in problems[:20]:
+    print(problem)
+  if problems:
+    print('%d records of %s do not match %s' % (len(problems), args.binary, args.text))
+    sys.exit(1)
+  print('All records of %s match %s' % (args.binary, args.text))
+
+if __name__ == '__main__':
+  main()
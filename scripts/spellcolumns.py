@@ -0,0 +1,249 @@
+# Columnar ingest of spells_us.txt for createdata.py
+#
+# The file is read once and the numeric columns are converted into typed NumPy arrays so the
+# derived fields (ignore filters, classMask/minLevel, focus bonuses and duration extension) are
+# evaluated for every spell at once. The effect slots are exploded into flat columns the same way
+# and scanned with array operations, only the SpellInfo records are still built per row.
+
+from array import array
+from itertools import compress, islice
+from operator import itemgetter
+import sys
+import warnings
+
+import numpy as np
+
+from createdata import (ADPS_EXT_DUR, ADPS_TANK_VALUE, IGNORE, IS_TARGETRING, MAX_HITS, SPA_RULES, SlotTable,
+                        abbreviate, buildInfo, toInt)
+from sparules import NO_LIMIT
+
+# name -> column in spells_us.txt
+INT_COLUMNS = {
+  'intId': 0, 'spellRange': 4, 'castTime': 8, 'lockoutTime': 9, 'recastTime': 10, 'maxDuration': 12, 'manaCost': 14,
+  'beneficial': 28, 'resist': 29, 'spellTarget': 30, 'skill': 32, 'recourse': 81, 'songWindow': 84, 'hateMod': 92,
+  'endurance': 96, 'combatSkill': 98, 'hateOver': 99, 'maxHits': 102, 'mgb': 110, 'dispellable': 111,
+  'focusable': 122, 'blockable': 130, 'rank': 133
+}
+LEVEL_COLUMNS = list(range(36, 36+16))
+SPELL_LINE_COLUMN = 164
+# rows converted to columns at once, enough for the array operations to pay off while the text of
+# a block stays small next to the parsed spells
+BLOCK_SIZE = 4096
+
+def getIgnoredMask(names):
+  ignored = np.char.str_len(names) <= 3
+  for ig in IGNORE:
+    ignored |= np.char.find(names, ig) >= 0
+  return ignored
+
+def getFocusBonus(focus, spellLine, intId):
+  bonus = np.zeros(len(intId), dtype=np.int64)
+  for key, value in focus.items():
+    # all focus keys are > 0 so the comparisons also cover the spellLine/intId > 0 checks
+    bonus += np.where(spellLine == key, value, 0)
+    bonus += np.where(intId == key, value, 0)
+  return bonus
+
+# numbers of a list of strings or None when one of them isn't a number
+def parseNumbers(texts, dtype):
+  with warnings.catch_warnings():
+    # fromstring warns when it stops early, which the length check catches
+    warnings.simplefilter('ignore', DeprecationWarning)
+    values = np.fromstring(' '.join(texts), dtype=dtype, sep=' ')
+  return values if len(values) == len(texts) else None
+
+# same as SlotTable.addSpell for every spell at once. returns the spell (counted from 0) of each
+# new row and its spa, base1, base2 and raw text columns
+def addSlotColumns(slots, ids, slotData):
+  index = len(slots.ids)
+  rowOffset = len(slots)
+  counts = np.fromiter((data.count('$') + 1 for data in slotData), np.int64, len(slotData))
+  pieces = '$'.join(slotData).split('$') if slotData else []
+  # empty slots have no | in them
+  used = np.fromiter(('|' in piece for piece in pieces), bool, len(pieces))
+  spell = np.repeat(np.arange(len(slotData)), counts)[used]
+  pieces = list(compress(pieces, used))
+
+  widths = np.fromiter((piece.count('|') + 1 for piece in pieces), np.int64, len(pieces))
+  if len(pieces) and widths.min() < 4:
+    raise ValueError('spell %s has an effect slot without base1 and base2' % ids[spell[widths.argmin()]])
+  fields = np.array('|'.join(pieces).split('|'), dtype=object)
+  starts = np.cumsum(widths) - widths
+  slotText, spaText, base1Text, base2Text = (fields[starts + i].tolist() for i in range(4))
+  del fields, pieces
+
+  slot = parseNumbers([text if text.isdigit() else '0' for text in slotText], np.int64)
+  spa = parseNumbers(spaText, np.int64)
+  if spa is None:
+    spa = np.fromiter(map(int, spaText), np.int64, len(spaText))
+  # int(float(text)) like toInt when every value is a number
+  base1, base2 = (parseNumbers(texts, np.float64) for texts in (base1Text, base2Text))
+  base1 = base1.astype(np.int64) if base1 is not None else np.fromiter(map(toInt, base1Text), np.int64, len(spell))
+  base2 = base2.astype(np.int64) if base2 is not None else np.fromiter(map(toInt, base2Text), np.int64, len(spell))
+  base1Text = list(map(sys.intern, base1Text))
+  base2Text = list(map(sys.intern, base2Text))
+
+  slots.ids.extend(ids)
+  slots.starts.extend((np.cumsum(np.bincount(spell, minlength=len(ids))) + rowOffset).tolist())
+  for name, values in (('spell', spell + index), ('slot', slot), ('spa', spa), ('base1', base1), ('base2', base2)):
+    column = getattr(slots, name)
+    column.frombytes(values.astype(column.typecode).tobytes())
+  slots.base1Text.extend(base1Text)
+  slots.base2Text.extend(base2Text)
+
+  # rows of each SPA, added in the order the SPAs first appear like addSpell
+  order = np.argsort(spa, kind='stable')
+  groups = np.split(order, np.flatnonzero(np.diff(spa[order])) + 1) if len(order) else []
+  for rows in sorted(groups, key=lambda rows: rows[0]):
+    slots.bySpa.setdefault(int(spa[rows[0]]), array('I')).frombytes((rows + rowOffset).astype('I').tobytes())
+
+  return spell, spa, base1, base2, base1Text, base2Text
+
+# same as scanSlots for every spell at once. the rows of a spell are scanned in reverse so the
+# first damage slot sets damaging and an SPA 138 slot sets requireDet for the slots before it
+def scanSlotColumns(count, spell, spa, base1, base2, base1Text, base2Text, adps):
+  rowCount = len(spa)
+  rows = np.arange(rowCount)
+  hasSlots = np.bincount(spell, minlength=count) > 0
+  starts = np.searchsorted(spell, np.arange(count))[hasSlots]
+
+  # closest SPA 138 slot at or after each row, when it is in the same spell
+  detRows = np.flatnonzero(spa == 138)
+  requireDet = np.zeros(rowCount, dtype=bool)
+  requireDet[detRows] = [base1Text[row] == '0' for row in detRows.tolist()]
+  det = np.full(rowCount, rowCount)
+  det[detRows] = detRows
+  det = np.minimum.accumulate(det[::-1])[::-1]
+  hasDet = det < rowCount
+  det = np.minimum(det, rowCount - 1)
+  hasDet &= spell[det] == spell
+  requireDet = requireDet[det]
+
+  valid = (spa >= 0) & (spa < SPA_RULES.size)
+  rule = np.where(valid, spa, 0)
+  adpsBits = np.array(SPA_RULES.adps, dtype=np.int64)[rule]
+  detrimentalBits = np.array(SPA_RULES.detrimental, dtype=np.int64)[rule]
+  beneficialBits = np.array(SPA_RULES.beneficial, dtype=np.int64)[rule]
+  minBase1 = np.array(SPA_RULES.minBase1, dtype=np.int64)
+  # NO_LIMIT doesn't fit in an int64, every base1 is below it
+  unlimited = np.array([value == NO_LIMIT for value in SPA_RULES.maxBase1])
+  maxBase1 = np.array([min(value, NO_LIMIT - 1) for value in SPA_RULES.maxBase1], dtype=np.int64)
+  inRange = valid & (adpsBits != 0) & (minBase1[rule] <= base1) & ((base1 < maxBase1[rule]) | unlimited[rule])
+  bits = np.where(hasDet, np.where(requireDet, detrimentalBits, beneficialBits), adpsBits)
+  bits = np.where(inRange, bits, 0)
+
+  adps = adps.copy()
+  damaging = np.zeros(count, dtype=np.int64)
+  if len(starts):
+    withSlots = np.flatnonzero(hasSlots)
+    adps[withSlots] |= np.bitwise_or.reduceat(bits, starts)
+    first = np.minimum.reduceat(np.where(np.isin(spa, (0, 79, 100)), rows, rowCount), starts)
+    damaged = first < rowCount
+    value1 = base1[np.minimum(first, rowCount - 1)]
+    damaging[withSlots[damaged]] = np.where(value1 <= -50000000, 2, np.where(value1 > 0, -1, 1))[damaged]
+    # filter some obvious non-player adps
+    adps[withSlots[np.logical_or.reduceat(spa == 22, starts)]] = 0
+
+  links = [[] for i in range(count)]
+  classMasks = [[] for i in range(count)]
+  found = np.flatnonzero(((np.isin(spa, (339, 340, 373, 374)) & (base2 > 0)) | ((spa == 406) & (base1 > 0)) |
+                         (spa == 411)))[::-1]
+  for row, index, value, value1 in zip(found.tolist(), spell[found].tolist(), spa[found].tolist(),
+                                       base1[found].tolist()):
+    if value == 411:
+      classMasks[index].append(value1 >> 1)
+    else:
+      links[index].append(('spa%d' % value, base1Text[row] if value in (373, 406) else base2Text[row]))
+  return adps, damaging, links, classMasks
+
+def readColumns(lines):
+  # only keep the text columns that are needed so the full rows can be released as they are read
+  picker = itemgetter(*(list(INT_COLUMNS.values()) + LEVEL_COLUMNS))
+  ids, names, recourses, spellLines, slots, numbers = [], [], [], [], [], []
+  for line in lines:
+    data = line.split('^')
+    ids.append(data[0])
+    names.append(data[1])
+    recourses.append(data[81])
+    spellLines.append(data[SPELL_LINE_COLUMN])
+    slots.append(data[-1])
+    numbers.append(' '.join(picker(data)))
+
+  keep = ~getIgnoredMask(np.array(names))
+  numbers = ' '.join(compress(numbers, keep))
+  table = np.fromstring(numbers, dtype=np.int64, sep=' ').reshape(-1, len(INT_COLUMNS) + len(LEVEL_COLUMNS))
+
+  columns = { key: table[:, i] for i, key in enumerate(INT_COLUMNS) }
+  columns['levels'] = table[:, len(INT_COLUMNS):]
+  spellLine = np.array(list(compress(spellLines, keep)), dtype=str)
+  columns['spellLine'] = np.where(np.char.isdigit(spellLine), spellLine, '0').astype(np.int64)
+  text = dict()
+  for key, values in (('id', ids), ('name', names), ('recourse', recourses), ('slots', slots)):
+    text[key] = list(compress(values, keep))
+  return text, columns
+
+def parseSpellBlock(lines, slots):
+  text, c = readColumns(lines)
+
+  spellTarget = c['spellTarget'].copy()
+  names = np.array(text['name'], dtype=str)
+  for test in IS_TARGETRING:
+    spellTarget[np.char.startswith(names, test)] = 45
+
+  # add focus AAs for additional hits
+  maxHits = c['maxHits'] + getFocusBonus(MAX_HITS, c['spellLine'], c['intId'])
+
+  # ignore long term beneficial buffs like FIRE DAMAGE
+  origDuration = c['maxDuration']
+  keep = ~((origDuration == 1950) & (c['castTime'] == 0) & (c['lockoutTime'] == 0) & (c['recastTime'] == 0) &
+           (c['beneficial'] != 0))
+
+  playable = c['levels'] <= 254
+  classMask = (playable * (1 << np.arange(len(LEVEL_COLUMNS), dtype=np.int64))).sum(axis=1)
+  classMask[origDuration == 1950] = 65535
+  minLevel = np.where(playable, c['levels'], 255).min(axis=1, initial=255)
+
+  adps = np.where((c['skill'] == 15) & (c['endurance'] > 0), ADPS_TANK_VALUE, 0)
+
+  # apply 100% buff extension and focus AAs that extend duration
+  extend = (c['beneficial'] != 0) & (c['focusable'] == 0) & (c['combatSkill'] == 0) & (origDuration > 1)
+  maxDuration = np.where(extend, origDuration * 2, origDuration) + getFocusBonus(ADPS_EXT_DUR, c['spellLine'], c['intId'])
+
+  ids, names, recourseIds = [list(compress(text[key], keep)) for key in ('id', 'name', 'recourse')]
+  slotColumns = addSlotColumns(slots, ids, list(compress(text['slots'], keep)))
+  del text
+  adps, damaging, links, classMasks = scanSlotColumns(len(ids), *slotColumns, adps[keep])
+
+  abbrvs = dict()
+  results = []
+  columns = [c['intId'], c['castTime'], c['beneficial'], c['blockable'], c['combatSkill'], classMask, c['dispellable'],
+             c['focusable'], c['hateMod'], c['hateOver'], c['lockoutTime'], c['manaCost'], maxDuration, c['mgb'],
+             origDuration, maxHits, c['resist'], c['skill'], c['rank'], minLevel, c['recastTime'], spellTarget,
+             c['spellRange'], c['songWindow'], c['recourse']]
+  columns = [column[keep].tolist() for column in columns]
+
+  for (id, name, recourseId, spellAdps, damaging, links, classMasks, intId, castTime, beneficial, blockable,
+       combatSkill, mask, dispellable, focusable, hateMod, hateOver, lockoutTime, manaCost, duration, mgb, orig, hits,
+       resist, skill, rank, level, recastTime, target, spellRange, songWindow,
+       recourse) in zip(ids, names, recourseIds, adps.tolist(), damaging.tolist(), links, classMasks, *columns):
+    if name not in abbrvs:
+      abbrvs[name] = abbreviate(name)
+
+    if recourse > 0:
+      links.append(('recourse', recourseId))
+
+    results.append(buildInfo(id, intId, name, abbrvs[name], spellAdps, castTime, damaging, beneficial, blockable,
+                             combatSkill, mask, dispellable, focusable, hateMod, hateOver, lockoutTime, manaCost,
+                             duration, mgb, orig, hits, links, classMasks, resist, skill, rank, level, recastTime,
+                             target, spellRange, songWindow))
+  return results
+
+# same as parseSpellFile, the rows are parsed BLOCK_SIZE at a time
+def parseSpellColumns(fileName, slots=None):
+  slots = SlotTable() if slots is None else slots
+  with open(fileName, 'r') as db:
+    while True:
+      lines = list(islice(db, BLOCK_SIZE))
+      if not lines:
+        break
+      yield from parseSpellBlock(lines, slots)
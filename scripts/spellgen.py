@@ -0,0 +1,147 @@
+# Generates synthetic spells_us.txt and spells_us_str.txt files for testing and benchmarking createdata.py
+#
+# Rows follow the columns createdata.py reads and roughly follow the shape of the live data: spell
+# lines with rank and roman numeral suffixes, duplicate names, procs and recourses pointing at other
+# spells, ignored test spells and lands on messages shared between ranks. Scale 1 is about the size of
+# a current spells_us.txt.
+
+import argparse
+import os.path
+import random
+
+from createdata import ADPS_LIST, DBSpellsFile, DBSpellsStrFile
+
+REAL_ROWS = 50000
+SPELL_COLUMNS = 176
+PROC_SPAS = [ 339, 340, 373, 374, 406 ]
+COMMON_SPAS = [ 0, 0, 0, 0, 79, 100, 3, 11, 15, 85, 99, 138, 147, 189, 200, 254, 254, 254, 254 ]
+SYLLABLES = [ 'ar', 'bel', 'cor', 'dra', 'el', 'fen', 'gor', 'hal', 'ix', 'jor', 'kal', 'lor', 'mor', 'nex', 'or', 'pyr',
+              'quel', 'ras', 'sar', 'tor', 'ul', 'vex', 'wyn', 'xi', 'yor', 'zal' ]
+WORDS = [ 'Bolt', 'Strike', 'Blade', 'Ward', 'Aura', 'Shield', 'Discipline', 'Spirit', 'Fury', 'Torrent', 'Blessing',
+          'Remedy', 'Gift', 'Breath', 'Roar', 'Chant', 'Glyph', 'Growth', 'Flames', 'Frost', 'Shock', 'Malediction' ]
+ROMAN = [ 'I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X', 'XI', 'XII', 'XIII', 'XIV', 'XV' ]
+SUFFIXES = [ ' Rk. II', ' Rk. III', ' Azia', ' Beza', ' Caza' ]
+IGNORED_NAMES = [ 'Test Shield', 'SummonTest', 'BetaTestSpell', 'Placeholder', 'AA_SPELL_PH', 'N/A' ]
+LANDS_ON = [ ' is %s by %s.', "'s body is %s by %s.", ' is surrounded by %s %s.', ' feels the %s of %s.' ]
+LANDS_ON_WORDS = [ 'struck', 'engulfed', 'infused', 'blessed', 'shielded', 'slowed', 'frozen', 'burned', 'fire', 'ice',
+                   'light', 'shadow', 'ancients', 'destruction', 'vigor', 'the wild' ]
+
+def getSpellName(rand):
+  name = ''.join(rand.choice(SYLLABLES) for i in range(rand.randint(2, 3))).capitalize()
+  return '%s %s' % (name, rand.choice(WORDS)) if rand.random() < 0.8 else '%s of %s' % (rand.choice(WORDS), name)
+
+# names of a spell line, most lines come in three ranks and older lines use roman numerals
+def getLineNames(rand):
+  name = getSpellName(rand)
+  roll = rand.random()
+  if roll < 0.45:
+    return [name, name + ' Rk. II', name + ' Rk. III']
+  if roll < 0.6:
+    return ['%s %s' % (name, numeral) for numeral in ROMAN[:rand.randint(2, 12)]]
+  if roll < 0.7:
+    return ['%s %d' % (name, i) for i in range(1, rand.randint(3, 8))]
+  if roll < 0.8:
+    return [name + rand.choice(SUFFIXES)]
+  return [name] * rand.randint(1, 2)
+
+def getSlots(rand, ids, isPlayer):
+  slots = []
+  for slot in range(1, min(12, int(rand.expovariate(0.35)) + 1) + 1):
+    roll = rand.random()
+    base2 = '0'
+    if roll < 0.08 and ids:
+      spa = rand.choice(PROC_SPAS)
+      target = str(rand.choice(ids))
+      base1 = target if spa in (373, 406) else str(rand.randint(1, 100))
+      base2 = target if spa not in (373, 406) else str(rand.randint(1, 100))
+    elif roll < 0.4 and isPlayer:
+      spa = rand.choice(ADPS_LIST)
+      base1 = str(rand.choice([rand.randint(1, 200), rand.randint(1, 50), 0, -rand.randint(1, 50)]))
+    elif roll < 0.41:
+      spa = 411
+      base1 = str(rand.choice([2, 4, 8, 16, 512, 4096, 65534]))
+    elif roll < 0.42:
+      spa = 22
+      base1 = '0'
+    else:
+      spa = rand.choice(COMMON_SPAS)
+      base1 = str(rand.choice([-rand.randint(1, 500000), rand.randint(1, 50000), 0, -50000001]))
+    slots.append('%d|%d|%s|%s|%d|%d' % (slot, spa, base1, base2, rand.randint(0, 5000), rand.choice([100, 101, 102, 116])))
+  return '$'.join(slots)
+
+def getMessages(rand):
+  landsOn = rand.choice(LANDS_ON) % (rand.choice(LANDS_ON_WORDS), rand.choice(LANDS_ON_WORDS))
+  youFeel = 'You feel %s.' % rand.choice(LANDS_ON_WORDS)
+  return youFeel, landsOn
+
+def generate(rows, spellsFile, stringsFile, seed=1):
+  rand = random.Random(seed)
+  ids = []
+  nextId = 1
+
+  with open(spellsFile, 'w') as spells, open(stringsFile, 'w') as strings:
+    while len(ids) < rows:
+      names = getLineNames(rand)
+      if rand.random() < 0.01:
+        names = [rand.choice(IGNORED_NAMES)]
+
+      isPlayer = rand.random() < 0.4
+      classes = rand.sample(range(16), rand.choice([1, 1, 1, 2, 3, 16])) if isPlayer else []
+      minLevel = rand.randint(1, 125)
+      youFeel, landsOn = getMessages(rand)
+      wearOff = 'Your %s spell has worn off.' % names[0].split()[0].lower()
+      duration = rand.choice([0, 0, 0, 1, 2, 10, 20, 100, 300, 1950, rand.randint(1, 600)])
+
+      for rank, name in enumerate(names):
+        id = nextId
+        nextId += rand.choice([1, 1, 1, 2, 5])
+        data = ['0'] * SPELL_COLUMNS
+        data[0] = str(id)
+        data[1] = name
+        data[4] = str(rand.choice([0, 100, 200, 250]))
+        data[8] = str(rand.choice([0, 0, 500, 1000, 3000]))
+        data[9] = str(rand.choice([0, 0, 1500]))
+        data[10] = str(rand.choice([0, 0, 6000, 60000, 600000]))
+        data[12] = str(duration)
+        data[14] = str(rand.choice([0, 0, 100, 1000]))
+        data[28] = str(rand.choice([0, 1]))
+        data[29] = str(rand.randint(0, 9))
+        data[30] = str(rand.choice([1, 5, 5, 6, 6, 6, 8, 14, 41, 45]))
+        data[32] = str(rand.choice([0, 15, 24, 52, 98]))
+        data[81] = str(rand.choice(ids)) if ids and rand.random() < 0.05 else '0'
+        data[84] = str(rand.choice([0, 0, 1]))
+        data[96] = str(rand.choice([0, 0, 100]))
+        data[98] = str(rand.choice([0, 0, 1]))
+        data[102] = str(rand.choice([0, 0, 0, 1, 5, 50]))
+        data[110] = str(rand.choice([0, 1]))
+        data[122] = str(rand.choice([0, 1]))
+        data[132] = str(rand.randint(0, 200000))
+        data[133] = str(rank + 1)
+        data[142] = str(rand.choice([0, 0, 5, 12]))
+        data[164] = str(rand.randint(1, 9000)) if rand.random() < 0.5 else ''
+        for column in range(36, 36+16):
+          data[column] = str(min(254, minLevel + rank * 5)) if column - 36 in classes else '255'
+        data[-1] = getSlots(rand, ids, isPlayer)
+        ids.append(id)
+
+        spells.write('^'.join(data))
+        spells.write('\n')
+        strings.write('%d^^^%s^%s^%s^\n' % (id, youFeel, landsOn, wearOff))
+
+        if len(ids) >= rows:
+          break
+  return len(ids)
+
+def main():
+  parser = argparse.ArgumentParser(description='Generate synthetic spell files for createdata.py')
+  parser.add_argument('--scale', type=float, default=1, help='number of rows as a multiple of %d (default 1)' % REAL_ROWS)
+  parser.add_argument('--seed', type=int, default=1, help='random seed (default 1)')
+  parser.add_argument('--out', default='.', help='directory to write %s and %s to' % (DBSpellsFile, DBSpellsStrFile))
+  args = parser.parse_args()
+
+  count = generate(int(REAL_ROWS * args.scale), os.path.join(args.out, DBSpellsFile), os.path.join(args.out, DBSpellsStrFile),
+                   args.seed)
+  print('Wrote %d spells to %s' % (count, args.out))
+
+if __name__ == '__main__':
+  main()
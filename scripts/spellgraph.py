@@ -0,0 +1,156 @@
+# Spell link graph used by createdata.py to propagate class masks through recourse and proc links
+#
+# An edge parent -> child means casting the parent spell can make the child land, either as its
+# recourse or through one of the proc SPAs (339, 340, 373, 374, 406). Class masks flow from parents
+# to children so procs are credited to the classes that can trigger them.
+
+import heapq
+import sys
+from collections import deque
+
+class SpellGraph:
+  def __init__(self):
+    self.nodes = dict()
+    self.children = dict()
+    self.parents = dict()
+    # edges from the links dicts, the child always inherits the parent class mask
+    self.always = set()
+    # procs of each spell in link order, each one is filled in with the spell's class mask when it
+    # has none yet
+    self.procs = dict()
+    # passes over the spells the last closeClassMasks took to settle
+    self.passCount = 0
+
+  @classmethod
+  def fromSpells(cls, spells, links):
+    graph = cls()
+    for id in spells:
+      graph.nodes[id] = True
+
+    # links hold the last spell (in file order) seen casting each proc
+    for linkType, procs in links.items():
+      for procId, parentId in procs.items():
+        if procId in spells and parentId in spells:
+          graph.addLink(parentId, procId, linkType, True)
+
+    for id, spell in spells.items():
+      for linkType, procId in spell.links:
+        if procId in spells:
+          graph.addLink(id, procId, linkType, False)
+    return graph
+
+  def addLink(self, parent, child, linkType, always):
+    self.nodes[parent] = True
+    self.nodes[child] = True
+    self.children.setdefault(parent, dict()).setdefault(child, set()).add(linkType)
+    self.parents.setdefault(child, dict()).setdefault(parent, set()).add(linkType)
+    if always:
+      self.always.add((parent, child))
+    else:
+      self.procs.setdefault(parent, []).append(child)
+
+  def getChildren(self, id):
+    return self.children.get(id, dict())
+
+  def getParents(self, id):
+    return self.parents.get(id, dict())
+
+  def getEdgeCount(self):
+    return sum(len(children) for children in self.children.values())
+
+  # every spell that can lead to the given spell through any chain of links
+  def getAncestors(self, id):
+    found = dict()
+    queue = deque([id])
+    while queue:
+      for parent in self.getParents(queue.popleft()):
+        if parent not in found and parent != id:
+          found[parent] = True
+          queue.append(parent)
+    return list(found)
+
+  # player spells (classMask > 0) that can produce the given proc
+  def getProducers(self, id, masks):
+    return [ancestor for ancestor in self.getAncestors(id) if masks.get(ancestor, 0) > 0]
+
+  # OR class masks down every chain of links with the rules of the old passes over the spells, run
+  # until nothing changes. visiting a spell first ORs in the positive masks of its always parents
+  # and then, when its own mask is positive, fills in each of its procs that still has a mask of 0.
+  # fills depend on which parent gets to a proc first so the passes are replayed in spell order,
+  # but only spells that can change are visited: the ones with a parent or proc to apply on the
+  # first pass and after that the ones whose own mask or always parent's mask changed. a mask
+  # changes at most once per bit it gains plus the fill, so a long chain that needs many passes
+  # only costs a visit per spell along it and not a pass over every spell
+  def closeClassMasks(self, masks):
+    nodes = list(self.nodes)
+    order = { id: i for i, id in enumerate(nodes) }
+    alwaysParents = dict()
+    alwaysChildren = dict()
+    for parent, child in self.always:
+      alwaysParents.setdefault(child, []).append(parent)
+      alwaysChildren.setdefault(parent, []).append(child)
+
+    # visit the spells later in this pass and the rest in the next one
+    def schedule(ids, position):
+      for id in ids:
+        if order[id] <= position:
+          pending.add(order[id])
+        elif order[id] not in queued:
+          queued.add(order[id])
+          heapq.heappush(queue, order[id])
+
+    # spells without any links keep their own mask
+    result = dict(masks)
+    pending = [order[id] for id in nodes if id in alwaysParents or id in self.procs]
+    passes = 0
+    while pending:
+      passes += 1
+      queue = sorted(pending)
+      queued = set(queue)
+      pending = set()
+      while queue:
+        position = heapq.heappop(queue)
+        node = nodes[position]
+        mask = result.get(node, 0)
+        for parent in alwaysParents.get(node, ()):
+          if result.get(parent, 0) > 0:
+            mask |= result[parent]
+        if mask != result.get(node, 0):
+          result[node] = mask
+          schedule(alwaysChildren.get(node, ()), position)
+        if mask > 0:
+          for proc in self.procs.get(node, ()):
+            if result.get(proc, 0) == 0:
+              result[proc] = mask
+              schedule([proc] + alwaysChildren.get(proc, []), position)
+    self.passCount = passes
+    return result, passes
+
+def main():
+  import createdata
+
+  if len(sys.argv) < 2:
+    print('usage: spellgraph.py SPELL_ID [SPELL_ID ...]')
+    print('lists the links of each spell and the player spells that can produce it')
+    return
+
+  dbStrings, uniqueYou, uniqueOther = createdata.loadStrings(createdata.DBSpellsStrFile)
+  spells, links = createdata.mergeSpells(createdata.parseSpellFile(createdata.DBSpellsFile), dbStrings, uniqueYou,
+                                         uniqueOther)
+  graph = createdata.propagateClassMasks(spells, links)
+  masks = { id: spell.classMask for id, spell in spells.items() }
+
+  for id in sys.argv[1:]:
+    if id not in spells:
+      print('%s: not found' % id)
+      continue
+
+    print('%s %s (classMask %d)' % (id, spells[id].name, masks[id]))
+    for title, edges in (('cast by', graph.getParents(id)), ('casts', graph.getChildren(id))):
+      for other, linkTypes in sorted(edges.items(), key=lambda edge: int(edge[0])):
+        print('  %s %s %s [%s]' % (title, other, spells[other].name, ', '.join(sorted(linkTypes))))
+    for producer in sorted(graph.getProducers(id, masks), key=int):
+      print('  produced by %s %s (classMask %d)' % (producer, spells[producer].name, masks[producer]))
+
+if __name__ == '__main__':
+  main()
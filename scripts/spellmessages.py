@@ -0,0 +1,166 @@
+# Index of the lands on and wear off messages in the spell data written by createdata.py
+#
+#   <output>_messages.txt   type ^ message ^ comma separated ids of the spells using it, best match first
+#
+# where type is you (landsOnYou), other (landsOnOther) or wearoff. Candidates are ranked with player
+# spells first, then by highest level and then newest id. MessageIndex loads the file and matches log
+# text in a few hash lookups. landsOnOther messages are stored as a suffix of the log line so they are
+# bucketed by their last word and then probed by length from the longest message down.
+#
+# Run with --bench to compare it against scanning every message.
+
+import argparse
+import random
+import time
+
+from createdata import OutputFile
+
+MESSAGE_TYPES = { 'you': 17, 'other': 18, 'wearoff': 19 }
+
+def getMessageFile(fileName):
+  return fileName.rsplit('.', 1)[0] + '_messages.txt'
+
+def getLastWord(text):
+  return text[text.rfind(' ') + 1:]
+
+def buildMessages(fileName):
+  found = { key: dict() for key in MESSAGE_TYPES }
+  with open(fileName, 'r') as db:
+    for line in db.read().splitlines():
+      data = line.split('^')
+      if len(data) < 20:
+        continue
+
+      id = data[0]
+      level = int(data[2]) if data[2].lstrip('-').isdigit() else 255
+      classMask = int(data[7]) if data[7].lstrip('-').isdigit() else 0
+      # player spells first, then highest level and newest id
+      rank = (0 if classMask > 0 and level < 255 else 1, -level, -int(id))
+      for key, column in MESSAGE_TYPES.items():
+        if data[column].strip():
+          found[key].setdefault(data[column], []).append((rank, id))
+
+  return { key: { message: [id for rank, id in sorted(spells)] for message, spells in messages.items() }
+           for key, messages in found.items() }
+
+def writeMessageIndex(fileName):
+  with open(getMessageFile(fileName), 'w') as output:
+    for key, messages in buildMessages(fileName).items():
+      for message in sorted(messages):
+        output.write('%s^%s^%s\n' % (key, message, ','.join(messages[message])))
+
+class MessageIndex:
+  def __init__(self, messages):
+    self.messages = messages
+    # last word -> lengths of the landsOnOther messages ending with it, longest first
+    self.suffixes = dict()
+    for message in messages['other']:
+      self.suffixes.setdefault(getLastWord(message), set()).add(len(message))
+    for word, lengths in self.suffixes.items():
+      self.suffixes[word] = sorted(lengths, reverse=True)
+
+  @classmethod
+  def load(cls, fileName):
+    messages = { key: dict() for key in MESSAGE_TYPES }
+    with open(fileName, 'r') as index:
+      for line in index.read().splitlines():
+        key, message, ids = line.split('^')
+        messages[key][message] = ids.split(',')
+    return cls(messages)
+
+  @classmethod
+  def fromSpellFile(cls, fileName):
+    return cls(buildMessages(fileName))
+
+  def matchYou(self, text):
+    return self.messages['you'].get(text, [])
+
+  def matchWearOff(self, text):
+    return self.messages['wearoff'].get(text, [])
+
+  # returns the text in front of the longest matching message (usually who it landed on) and the
+  # candidate spell ids or None when nothing matches
+  def matchOther(self, text):
+    lengths = self.suffixes.get(getLastWord(text))
+    if lengths:
+      candidates = self.messages['other']
+      for length in lengths:
+        if length < len(text):
+          ids = candidates.get(text[-length:])
+          if ids:
+            return text[:-length], ids
+    return None
+
+  # every way the text can be read as (type, target, candidate ids)
+  def match(self, text):
+    results = []
+    ids = self.matchYou(text)
+    if ids:
+      results.append(('you', None, ids))
+    found = self.matchOther(text)
+    if found:
+      results.append(('other', found[0], found[1]))
+    ids = self.matchWearOff(text)
+    if ids:
+      results.append(('wearoff', None, ids))
+    return results
+
+def scanOther(messages, text):
+  best = None
+  for message, ids in messages.items():
+    if len(message) < len(text) and text.endswith(message) and (best is None or len(message) > len(best[0])):
+      best = (message, ids)
+  return (text[:-len(best[0])], best[1]) if best else None
+
+def runBenchmark(fileName, count, scanCount):
+  t = time.perf_counter()
+  index = MessageIndex.fromSpellFile(fileName)
+  buildTime = time.perf_counter() - t
+
+  others = list(index.messages['other'])
+  if not others:
+    print('No landsOnOther messages found in %s' % fileName)
+    return
+
+  random.seed(1)
+  names = ['Kizant', 'Aeralin', 'a goblin warrior', 'Vallon Zek', 'Xegony']
+  lines = [random.choice(names) + random.choice(others) for i in range(count)]
+  lines += ['Kizant hits a goblin for 1234 points of damage.'] * (count // 10)
+
+  t = time.perf_counter()
+  matched = sum(1 for line in lines if index.matchOther(line))
+  indexTime = time.perf_counter() - t
+
+  t = time.perf_counter()
+  for line in lines[:scanCount]:
+    scanOther(index.messages['other'], line)
+  scanTime = (time.perf_counter() - t) * len(lines) / min(scanCount, len(lines))
+
+  print('%d landsOnOther messages, index built in %.3fs' % (len(others), buildTime))
+  print('index: %d lines (%d matched) in %.3fs, %.0f lines/s' % (len(lines), matched, indexTime, len(lines) / indexTime))
+  print('scan:  %.0f lines/s (estimated from %d lines), index is %.0fx faster' %
+        (len(lines) / scanTime, min(scanCount, len(lines)), scanTime / indexTime))
+
+def main():
+  parser = argparse.ArgumentParser(description='Look up or benchmark the lands on message index of the spell data')
+  parser.add_argument('text', nargs='*', help='log text to match (without the timestamp)')
+  parser.add_argument('--spells', default=OutputFile, help='spell file the index was built from (default %s)' % OutputFile)
+  parser.add_argument('--bench', type=int, nargs='?', const=200000, metavar='LINES',
+                      help='time matching LINES generated log lines against a full scan (default 200000)')
+  args = parser.parse_args()
+
+  if args.bench:
+    runBenchmark(args.spells, args.bench, 500)
+    return
+
+  index = MessageIndex.load(getMessageFile(args.spells))
+  for text in args.text:
+    results = index.match(text)
+    if not results:
+      print('%s: no match' % text)
+    for key, target, ids in results:
+      more = ' (+%d more)' % (len(ids) - 10) if len(ids) > 10 else ''
+      print('%s: %s%s -> %s%s' % (text, key, ' on %s' % target if target else '', ', '.join(ids[:10]), more))
+
+if __name__ == '__main__':
+  main()
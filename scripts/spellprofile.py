@@ -0,0 +1,105 @@
+# Phase timing, memory and counters for createdata.py --profile
+#
+# Each phase records its wall time plus the peak and retained memory traced by tracemalloc while
+# it ran. Tracing slows Python allocations down so compare profiled runs with each other and use
+# spellbench.py for absolute timings.
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from createdata import ADPS_CASTER_VALUE, ADPS_HEALER_VALUE, ADPS_MELEE_VALUE, ADPS_TANK_VALUE, IGNORE, SlotTable
+
+ProfileFile = 'createdata.profile.json'
+ADPS_BITS = { 'caster': ADPS_CASTER_VALUE, 'melee': ADPS_MELEE_VALUE, 'tank': ADPS_TANK_VALUE, 'healer': ADPS_HEALER_VALUE }
+
+# SlotTable that keeps track of the time spent decoding slots
+class TimedSlotTable(SlotTable):
+  def __init__(self):
+    super().__init__()
+    self.seconds = 0.0
+    self.calls = 0
+
+  def addSpell(self, id, slotData):
+    start = time.perf_counter()
+    index = super().addSpell(id, slotData)
+    self.seconds += time.perf_counter() - start
+    self.calls += 1
+    return index
+
+# the IGNORE pattern a spell name matched or None
+def getIgnoreReason(name):
+  if len(name) <= 3:
+    return 'name length <= 3'
+  for ig in IGNORE:
+    if ig in name:
+      return ig
+  return None
+
+class Profile:
+  def __init__(self):
+    self.phases = []
+    self.counters = dict()
+    self.slots = TimedSlotTable()
+    tracemalloc.start()
+
+  @contextmanager
+  def phase(self, name):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    self.phases.append({ 'phase': name, 'seconds': round(seconds, 4), 'peakMB': round(peak / 1048576, 2),
+                         'retainedMB': round((current - before) / 1048576, 2) })
+
+  def count(self, group, key, amount=1):
+    counters = self.counters.setdefault(group, dict())
+    counters[key] = counters.get(key, 0) + amount
+
+  # ignored rows by the IGNORE pattern they matched or the long term buff check of parseSpellRow
+  def countIgnored(self, fileName):
+    self.counters['ignored'] = dict()
+    for line in open(fileName, 'r'):
+      data = line.split('^')
+      reason = getIgnoreReason(data[1])
+      if reason is None and data[12] == '1950' and data[8] == data[9] == data[10] == '0' and data[28] != '0':
+        reason = 'long term beneficial buff'
+      if reason is not None:
+        self.count('ignored', reason)
+
+  def countSpells(self, spells):
+    self.counters['adps'] = { key: sum(1 for spell in spells.values() if spell.adps & bit)
+                              for key, bit in ADPS_BITS.items() }
+
+  def countPropagation(self, graph, before, spells):
+    self.counters['propagation'] = {
+      'nodes': len(graph.nodes),
+      'edges': graph.getEdgeCount(),
+      'passes': graph.passCount,
+      'changedMasks': sum(1 for id, spell in spells.items() if spell.classMask != before[id])
+    }
+
+  def getReport(self, mode):
+    slots = { 'spells': len(self.slots.ids), 'slots': len(self.slots) }
+    # slots decoded by worker processes are merged in without being timed
+    if self.slots.calls:
+      slots['seconds'] = round(self.slots.seconds, 4)
+    return { 'mode': mode, 'python': sys.version.split()[0], 'phases': self.phases, 'slotDecoding': slots,
+             'counters': self.counters }
+
+  def write(self, fileName, mode):
+    tracemalloc.stop()
+    report = self.getReport(mode)
+    with open(fileName, 'w') as output:
+      json.dump(report, output, indent=2)
+
+    print('%-10s %10s %10s %12s' % ('phase', 'seconds', 'peak MB', 'retained MB'))
+    for phase in report['phases']:
+      print('%-10s %10.3f %10.1f %12.1f' % (phase['phase'], phase['seconds'], phase['peakMB'], phase['retainedMB']))
+    if 'seconds' in report['slotDecoding']:
+      print('%-10s %10.3f   (%d slots, part of rows)' % ('slots', report['slotDecoding']['seconds'], len(self.slots)))
+    print('Wrote profile to %s' % fileName)
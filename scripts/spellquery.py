@@ -0,0 +1,195 @@
+# In memory query API over the spells derived by createdata.py
+#
+# Every spell gets a position and each index maps a value to a bitmap (a Python int with bit n set for
+# the spell at position n). Filters are ANDed together so a query costs a few big int operations
+# regardless of how many spells match each filter on its own. Level and duration use range indexes
+# holding one bitmap per distinct value of every spell with that value or higher.
+#
+#   from spellquery import buildIndex
+#   index = buildIndex()
+#   index.query(adps='melee', classMask=4, minLevel=120, minDuration=60)
+#
+# or from the command line
+#
+#   python spellquery.py --adps melee --class Paladin --min-level 120 --min-duration 60
+
+import argparse
+import time
+from bisect import bisect_left, bisect_right
+
+import createdata
+from spellsidecars import CLASS_NAMES
+
+ADPS_BITS = { 'caster': createdata.ADPS_CASTER_VALUE, 'melee': createdata.ADPS_MELEE_VALUE,
+              'tank': createdata.ADPS_TANK_VALUE, 'healer': createdata.ADPS_HEALER_VALUE }
+TICK_SECONDS = 6
+
+def toBitmap(positions, size):
+  bits = bytearray((size + 7) // 8)
+  for position in positions:
+    bits[position >> 3] |= 1 << (position & 7)
+  return int.from_bytes(bits, 'little')
+
+# bitmap per distinct value of every spell with that value or higher
+class RangeIndex:
+  def __init__(self, values):
+    order = sorted(range(len(values)), key=values.__getitem__, reverse=True)
+    bits = bytearray((len(values) + 7) // 8)
+    self.values = []
+    self.atLeast = []
+    for i, position in enumerate(order):
+      bits[position >> 3] |= 1 << (position & 7)
+      value = values[position]
+      if i + 1 == len(order) or values[order[i + 1]] != value:
+        self.values.append(value)
+        self.atLeast.append(int.from_bytes(bits, 'little'))
+    self.values.reverse()
+    self.atLeast.reverse()
+
+  # spells with low <= value <= high, either bound can be None
+  def getRange(self, low=None, high=None, all=0):
+    result = all
+    if low is not None:
+      i = bisect_left(self.values, low)
+      result &= self.atLeast[i] if i < len(self.values) else 0
+    if high is not None:
+      i = bisect_right(self.values, high)
+      if i < len(self.values):
+        result &= ~self.atLeast[i]
+    return result
+
+class SpellIndex:
+  def __init__(self, spells, slots=None, graph=None):
+    self.ids = list(spells)
+    self.spells = spells
+    self.graph = graph
+    self.positions = { id: position for position, id in enumerate(self.ids) }
+    self.all = (1 << len(self.ids)) - 1
+    size = len(self.ids)
+    infos = list(spells.values())
+
+    self.classes = { 1 << bit: toBitmap((p for p, sp in enumerate(infos) if sp.classMask & (1 << bit)), size)
+                     for bit in range(16) }
+    self.adps = { key: toBitmap((p for p, sp in enumerate(infos) if sp.adps & bit), size) for key, bit in ADPS_BITS.items() }
+    self.beneficial = toBitmap((p for p, sp in enumerate(infos) if sp.beneficial != 0), size)
+    self.procs = toBitmap((p for p, sp in enumerate(infos) if sp.procs), size)
+
+    targets = dict()
+    for position, sp in enumerate(infos):
+      targets.setdefault(sp.spellTarget, []).append(position)
+    self.targets = { target: toBitmap(positions, size) for target, positions in targets.items() }
+
+    self.spas = dict()
+    if slots is not None:
+      for spa, rows in slots.bySpa.items():
+        found = set()
+        for row in rows:
+          position = self.positions.get(slots.ids[slots.spell[row]])
+          if position is not None:
+            found.add(position)
+        self.spas[spa] = toBitmap(found, size)
+
+    self.levels = RangeIndex([sp.level for sp in infos])
+    self.durations = RangeIndex([sp.maxDuration for sp in infos])
+
+  # bitmap of the spells matching every given filter. classMask and adps match spells with any of the
+  # given bits, durations are in seconds and beneficial is True or False
+  def getBitmap(self, classMask=None, adps=None, spa=None, spellTarget=None, minLevel=None, maxLevel=None,
+                minDuration=None, maxDuration=None, beneficial=None, procs=None):
+    result = self.all
+    if classMask is not None:
+      result &= self.getAny(self.classes, [bit for bit in self.classes if classMask & bit])
+    if adps is not None:
+      keys = [adps] if isinstance(adps, str) else adps
+      result &= self.getAny(self.adps, keys)
+    if spa is not None:
+      result &= self.getAny(self.spas, [spa] if isinstance(spa, int) else spa)
+    if spellTarget is not None:
+      result &= self.getAny(self.targets, [spellTarget] if isinstance(spellTarget, int) else spellTarget)
+    if minLevel is not None or maxLevel is not None:
+      result &= self.levels.getRange(minLevel, maxLevel, self.all)
+    if minDuration is not None or maxDuration is not None:
+      # maxDuration is in ticks, a minimum rounds up and a maximum rounds down
+      low = -(-minDuration // TICK_SECONDS) if minDuration is not None else None
+      high = maxDuration // TICK_SECONDS if maxDuration is not None else None
+      result &= self.durations.getRange(low, high, self.all)
+    if beneficial is not None:
+      result &= self.beneficial if beneficial else ~self.beneficial
+    if procs is not None:
+      result &= self.procs if procs else ~self.procs
+    return result & self.all
+
+  def getAny(self, index, keys):
+    result = 0
+    for key in keys:
+      result |= index.get(key, 0)
+    return result
+
+  def getIds(self, bitmap):
+    ids = []
+    # reversed binary digits so that digit n is the spell at position n
+    digits = bin(bitmap)[:1:-1]
+    position = digits.find('1')
+    while position >= 0:
+      ids.append(self.ids[position])
+      position = digits.find('1', position + 1)
+    return ids
+
+  def query(self, **filters):
+    return self.getIds(self.getBitmap(**filters))
+
+  def count(self, **filters):
+    return bin(self.getBitmap(**filters)).count('1')
+
+# run the createdata.py pipeline without writing anything and index the result
+def buildIndex(spellsFile=createdata.DBSpellsFile, stringsFile=createdata.DBSpellsStrFile):
+  dbStrings, uniqueYou, uniqueOther = createdata.loadStrings(stringsFile)
+  slots = createdata.SlotTable()
+  spells, links = createdata.mergeSpells(createdata.parseSpellFile(spellsFile, slots), dbStrings, uniqueYou, uniqueOther)
+  graph = createdata.propagateClassMasks(spells, links)
+  return SpellIndex(spells, slots, graph)
+
+def getClassMask(value):
+  for mask, name in CLASS_NAMES.items():
+    if name.lower() == value.lower():
+      return mask
+  return int(value)
+
+def main():
+  parser = argparse.ArgumentParser(description='Query the spells derived by createdata.py')
+  parser.add_argument('--class', dest='classMask', type=getClassMask, help='class name or SpellClass value')
+  parser.add_argument('--adps', nargs='+', choices=list(ADPS_BITS), help='ADPS types, any of them can match')
+  parser.add_argument('--spa', type=int, nargs='+', help='SPAs used in any slot, any of them can match')
+  parser.add_argument('--target', type=int, nargs='+', help='spell target types')
+  parser.add_argument('--min-level', type=int)
+  parser.add_argument('--max-level', type=int)
+  parser.add_argument('--min-duration', type=int, help='seconds')
+  parser.add_argument('--max-duration', type=int, help='seconds')
+  parser.add_argument('--beneficial', type=int, choices=[0, 1])
+  parser.add_argument('--procs', action='store_true', help='only spells that cast procs or have a recourse')
+  parser.add_argument('--limit', type=int, default=50, help='number of spells to print (default 50)')
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  index = buildIndex()
+  print('Indexed %d spells in %.2fs' % (len(index.ids), time.perf_counter() - start))
+
+  filters = { 'classMask': args.classMask, 'adps': args.adps, 'spa': args.spa, 'spellTarget': args.target,
+              'minLevel': args.min_level, 'maxLevel': args.max_level, 'minDuration': args.min_duration,
+              'maxDuration': args.max_duration, 'beneficial': None if args.beneficial is None else args.beneficial == 1,
+              'procs': True if args.procs else None }
+
+  start = time.perf_counter()
+  ids = index.query(**filters)
+  elapsed = time.perf_counter() - start
+
+  for id in ids[:args.limit]:
+    sp = index.spells[id]
+    procs = ' procs %s' % ','.join(sp.procs) if sp.procs else ''
+    print('%s %s (level %d, classMask %d, adps %d, target %d, %ds)%s' % (id, sp.name, sp.level, sp.classMask,
+                                                                        sp.adps, sp.spellTarget,
+                                                                        sp.maxDuration * TICK_SECONDS, procs))
+  print('%d spells matched in %.3fms' % (len(ids), elapsed * 1000))
+
+if __name__ == '__main__':
+  main()
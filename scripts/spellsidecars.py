@@ -0,0 +1,163 @@
+# Lookup tables that EQDataStore builds from data/spells.txt at startup, precomputed by createdata.py
+#
+#   <output>_abbrv.txt    abbreviated name ^ id of the spell GetSpellByAbbrv returns
+#   <output>_names.txt    spell name ^ comma separated ids of every spell with that name
+#   <output>_classes.txt  spell name ^ class name for spells that identify a single class
+#
+# Run with the name of the spell file (output.txt by default) to check that the tables next to it
+# still agree with it.
+
+import os.path
+import sys
+
+from createdata import OutputFile, abbreviate
+
+ItemSpellsFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EQLogParser', 'data', 'itemspells.txt')
+
+# SpellClass values and their names from Resource.resx
+CLASS_NAMES = { 1: 'Warrior', 2: 'Cleric', 4: 'Paladin', 8: 'Ranger', 16: 'Shadow Knight', 32: 'Druid', 64: 'Monk',
+                128: 'Bard', 256: 'Rogue', 512: 'Shaman', 1024: 'Necromancer', 2048: 'Wizard', 4096: 'Magician',
+                8192: 'Enchanter', 16384: 'Beastlord', 32768: 'Berserker' }
+CLERIC = 2
+BARD = 128
+
+# min and max values of the columns ParseCustomSpellData reads into smaller types. out of range
+# values throw an OverflowException and the spell is skipped
+COLUMN_RANGES = { 2: (0, 255), 5: (0, 65535), 6: (0, 255), 7: (0, 65535), 8: (-32768, 32767), 12: (0, 255),
+                  14: (0, 255) }
+
+def getSidecarFiles(fileName):
+  base = os.path.splitext(fileName)[0]
+  return { 'abbrv': base + '_abbrv.txt', 'names': base + '_names.txt', 'classes': base + '_classes.txt' }
+
+# read the spell file the same way ParseCustomSpellData does and return the spells it keeps
+def readSpells(fileName):
+  spells = []
+  with open(fileName, 'r') as db:
+    for line in db.read().splitlines():
+      data = line.split('^')
+      if len(data) < 11:
+        continue
+
+      inRange = True
+      for column, (low, high) in COLUMN_RANGES.items():
+        if not low <= int(data[column]) <= high:
+          inRange = False
+      if not inRange:
+        continue
+
+      spells.append({ 'id': data[0], 'name': data[1], 'abbrv': abbreviate(data[1]), 'level': int(data[2]),
+                      'classMask': int(data[7]) })
+  return spells
+
+def loadItemSpells(fileName):
+  itemSpells = set()
+  if os.path.isfile(fileName):
+    with open(fileName, 'r') as data:
+      for line in data.read().splitlines():
+        if line and line[0] != '#':
+          itemSpells.add(line.upper())
+  return itemSpells
+
+def buildAbbrvTable(spells):
+  table = dict()
+  for spell in spells:
+    abbrv = spell['abbrv']
+    # try to keep the newest version (string.Compare with OrdinalIgnoreCase)
+    if abbrv not in table or table[abbrv]['name'].upper() < spell['name'].upper():
+      table[abbrv] = spell
+  return { abbrv: spell['id'] for abbrv, spell in table.items() }
+
+def buildNameTable(spells):
+  table = dict()
+  for spell in spells:
+    table.setdefault(spell['name'], []).append(spell['id'])
+  return table
+
+def isClassSpell(spell):
+  abbrv = spell['abbrv'].upper()
+  return not ('ILLUSION' in abbrv or 'MOUNT' in abbrv or abbrv.endswith(' GATE') or ' SYNERGY' in abbrv or
+              'CALL OF FIRE' in abbrv or 'PET HEAL' in abbrv or
+              (spell['classMask'] == CLERIC and 'Effect' in spell['abbrv']) or
+              (spell['classMask'] == BARD and spell['level'] >= 250))
+
+def buildClassTable(spells, itemSpells):
+  table = dict()
+  keepOut = set()
+  for spell in spells:
+    name = spell['name']
+
+    # ignore spells tied to items
+    if name.upper() in itemSpells:
+      continue
+
+    # these need to be unique and keep track if a conflict is found
+    if spell['level'] < 255 and spell['classMask'] in CLASS_NAMES:
+      if isClassSpell(spell):
+        if name in table:
+          del table[name]
+          keepOut.add(name)
+        elif name not in keepOut:
+          table[name] = CLASS_NAMES[spell['classMask']]
+    elif name in table:
+      del table[name]
+      keepOut.add(name)
+  return table
+
+def buildSidecars(fileName, itemSpellsFile):
+  spells = readSpells(fileName)
+  tables = dict()
+  tables['abbrv'] = { abbrv: [id] for abbrv, id in buildAbbrvTable(spells).items() }
+  tables['names'] = buildNameTable(spells)
+  classes = buildClassTable(spells, loadItemSpells(itemSpellsFile))
+  tables['classes'] = { name: [className] for name, className in classes.items() }
+  return tables
+
+def writeSidecars(fileName, itemSpellsFile=ItemSpellsFile):
+  tables = buildSidecars(fileName, itemSpellsFile)
+  for key, sidecar in getSidecarFiles(fileName).items():
+    with open(sidecar, 'w') as output:
+      for name in sorted(tables[key]):
+        output.write('%s^%s\n' % (name, ','.join(tables[key][name])))
+
+def readSidecar(fileName):
+  table = dict()
+  with open(fileName, 'r') as sidecar:
+    for line in sidecar.read().splitlines():
+      name, values = line.rsplit('^', 1)
+      table[name] = values.split(',')
+  return table
+
+# returns a list of differences between the sidecars and the spell file they were built from
+def verifySidecars(fileName, itemSpellsFile=ItemSpellsFile):
+  problems = []
+  tables = buildSidecars(fileName, itemSpellsFile)
+  for key, sidecar in getSidecarFiles(fileName).items():
+    if not os.path.isfile(sidecar):
+      problems.append('%s is missing' % sidecar)
+      continue
+
+    found = readSidecar(sidecar)
+    for name in sorted(set(tables[key]) | set(found)):
+      if name not in found:
+        problems.append('%s: missing %s' % (sidecar, name))
+      elif name not in tables[key]:
+        problems.append('%s: unexpected %s' % (sidecar, name))
+      elif found[name] != tables[key][name]:
+        problems.append('%s: %s is %s but %s has %s' % (sidecar, name, ','.join(found[name]), fileName,
+                                                      ','.join(tables[key][name])))
+  return problems
+
+def main():
+  fileName = sys.argv[1] if len(sys.argv) > 1 else OutputFile
+  problems = verifySidecars(fileName)
+  for problem in problems:
+    print(problem)
+
+  if problems:
+    print('%d problems found in the lookup tables for %s' % (len(problems), fileName))
+    sys.exit(1)
+  print('Lookup tables for %s are up to date' % fileName)
+
+if __name__ == '__main__':
+  main()